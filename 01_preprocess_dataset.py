@@ -1,7 +1,11 @@
 import datasets
-import re
 import os
+import pyarrow.compute as pc
 import yaml
+from collections import Counter
+
+# Statistics reported for every preprocessed example, in the order they are printed
+PREPROCESSING_STATISTICS = ("chars_before", "chars_after", "non_ascii_removed", "spaces_removed")
 
 # Load configuration from YAML file
 def load_config(yaml_file="config.yaml"):
@@ -18,70 +22,102 @@ def load_config(yaml_file="config.yaml"):
         config = yaml.safe_load(file)
     return config
 
-# Initialize counters
-non_ascii_count = 0
-extra_space_count = 0
-total_chars_before = 0
-total_chars_after = 0
-
 # Basic text preprocessing function with counting
-def preprocess_text(text, config):
+def preprocess_text(text, config, statistics=None):
     """
     Clean and normalize text by:
     - Removing non-ASCII characters (optional)
     - Lowercasing all characters (optional)
     - Removing extra spaces (optional)
-    
-    Counts the number of removed non-ASCII characters and extra spaces.
+
+    Each step is a single C-level pass over the string (`str.encode`, `str.lower`,
+    `str.split`), so no regular expression is scanned, and the removed characters are
+    counted from the length differences instead of a second scan.
 
     Args:
         text (str): The raw input text.
         config (dict): Preprocessing configuration settings.
+        statistics (Counter, optional): If given, the number of characters before and after
+            preprocessing and the number of removed non-ASCII characters and extra spaces are
+            added to it.
 
     Returns:
         str: Cleaned and normalized text.
     """
-    global non_ascii_count, extra_space_count, total_chars_before, total_chars_after
-    
-    # Count total characters before preprocessing
-    total_chars_before += len(text)
+    chars_before = len(text)
 
     # Remove non-ASCII characters if enabled in config
     if config['preprocessing']['remove_non_ascii']:
-        non_ascii_count += len(re.findall(r'[^\x00-\x7F]+', text))
-        text = re.sub(r'[^\x00-\x7F]+', '', text)
-    
+        text = text.encode("ascii", "ignore").decode("ascii")
+    non_ascii_removed = chars_before - len(text)
+
     # Lowercase if enabled in config
     if config['preprocessing']['lowercase']:
         text = text.lower()
-    
-    # Remove extra spaces if enabled in config
+
+    # Remove extra spaces if enabled in config; same as re.sub(r'\s+', ' ', text).strip()
+    chars_before_spaces = len(text)
     if config['preprocessing']['remove_extra_spaces']:
-        initial_length = len(text)
-        text = re.sub(r'\s+', ' ', text).strip()
-        extra_space_count += initial_length - len(text)
+        text = " ".join(text.split())
 
-    # Count total characters after preprocessing
-    total_chars_after += len(text)
-    
+    if statistics is not None:
+        statistics["chars_before"] += chars_before
+        statistics["chars_after"] += len(text)
+        statistics["non_ascii_removed"] += non_ascii_removed
+        statistics["spaces_removed"] += chars_before_spaces - len(text)
     return text
 
-# Preprocess the dataset by applying the cleaning function to each text sample
+# Preprocess a batch of examples, returning the statistics of each example alongside its text
+def preprocess_batch(batch, config):
+    """
+    Preprocess a batch of examples for `datasets.Dataset.map(batched=True)`.
+
+    The statistics are returned as extra columns rather than accumulated in globals, so they
+    stay correct when the map runs in several worker processes; `preprocess_dataset` sums
+    them and drops the columns.
+
+    Args:
+        batch (dict): A batch with a "text" column.
+        config (dict): The configuration dictionary.
+
+    Returns:
+        dict: The preprocessed "text" column and one column per name in PREPROCESSING_STATISTICS.
+    """
+    output = {"text": []}
+    output.update((name, []) for name in PREPROCESSING_STATISTICS)
+    for text in batch['text']:
+        statistics = Counter()
+        output["text"].append(preprocess_text(text, config, statistics))
+        for name in PREPROCESSING_STATISTICS:
+            output[name].append(statistics[name])
+    return output
+
+# Preprocess the dataset by applying the cleaning function to batches of text samples
 def preprocess_dataset(dataset, config):
     """
-    Apply preprocessing to the entire dataset (train, validation, test),
-    while also keeping track of removed characters and spaces.
+    Apply preprocessing to the entire dataset (train, validation, test) in batches, on
+    `num_proc` worker processes, while also keeping track of removed characters and spaces.
 
     Args:
         dataset: The Hugging Face dataset object.
         config: The configuration dictionary.
 
     Returns:
-        dataset: The preprocessed dataset.
+        tuple: The preprocessed dataset and a Counter with the statistics summed over all splits.
     """
+    statistics = Counter()
     for split in dataset.keys():
-        dataset[split] = dataset[split].map(lambda example: {"text": preprocess_text(example['text'], config)})
-    return dataset
+        processed = dataset[split].map(
+            preprocess_batch,
+            batched=True,
+            batch_size=config['preprocessing']['batch_size'],
+            num_proc=config['preprocessing']['num_proc'],
+            fn_kwargs={"config": config},
+        )
+        for name in PREPROCESSING_STATISTICS:
+            statistics[name] += pc.sum(processed.data.column(name)).as_py() or 0
+        dataset[split] = processed.remove_columns(list(PREPROCESSING_STATISTICS))
+    return dataset, statistics
 
 # Main function to load, preprocess, and save the dataset
 def main():
@@ -94,7 +130,7 @@ def main():
     dataset = datasets.load_dataset(dataset_name, dataset_version)
 
     # Preprocess the dataset
-    preprocessed_dataset = preprocess_dataset(dataset, config)
+    preprocessed_dataset, statistics = preprocess_dataset(dataset, config)
 
     # Specify the path to save the preprocessed dataset
     dataset_save_path = config['dataset']['dataset_save_path']
@@ -107,13 +143,14 @@ def main():
     preprocessed_dataset.save_to_disk(dataset_save_path)
 
     # Calculate percentages
-    removed_non_ascii_percentage = (non_ascii_count / total_chars_before) * 100 if total_chars_before > 0 else 0
-    removed_spaces_percentage = (extra_space_count / total_chars_before) * 100 if total_chars_before > 0 else 0
+    total_chars_before = statistics["chars_before"]
+    removed_non_ascii_percentage = (statistics["non_ascii_removed"] / total_chars_before) * 100 if total_chars_before > 0 else 0
+    removed_spaces_percentage = (statistics["spaces_removed"] / total_chars_before) * 100 if total_chars_before > 0 else 0
 
     # Print the statistics
     print(f"Preprocessed dataset saved to {dataset_save_path}")
-    print(f"Total non-ASCII characters removed: {non_ascii_count}")
-    print(f"Total unwanted spaces removed: {extra_space_count}")
+    print(f"Total non-ASCII characters removed: {statistics['non_ascii_removed']}")
+    print(f"Total unwanted spaces removed: {statistics['spaces_removed']}")
     print(f"Removed non-ASCII characters as a percentage of total characters: {removed_non_ascii_percentage:.2f}%")
     print(f"Removed unwanted spaces as a percentage of total characters: {removed_spaces_percentage:.2f}%")
 
@@ -1,66 +1,1027 @@
 # This code is based on Andrej Karpathy's video: https://www.youtube.com/watch?v=zduSFxRajkE&t=3636s
 
+import bisect
+import codecs
+import heapq
+import itertools
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Iterator, Mapping
+
+import yaml
+
+try:
+    import regex
+except ImportError:  # the GPT-style split patterns need the third-party regex module for \p{...} classes
+    regex = None
+
+try:
+    import numpy as np
+except ImportError:  # only needed by the "numpy" backend
+    np = None
+
+# Pre-tokenization patterns used to split text into chunks before BPE is applied
+GPT2_SPLIT_PATTERN = r"""'(?:[sdmt]|ll|ve|re)| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"""
+GPT4_SPLIT_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]++[\r\n]*|\s*[\r\n]|\s+(?!\S)|\s+"""
+
+# Batches smaller than this (in characters to encode or tokens to decode) are processed in-process,
+# as starting a process pool costs more than it saves
+MIN_PARALLEL_BATCH_SIZE = 1_000_000
+
+# Split patterns that can be named in config.yaml
+SPLIT_PATTERNS = {"none": None, "gpt2": GPT2_SPLIT_PATTERN, "gpt4": GPT4_SPLIT_PATTERN}
+
+# Backends that count pairs and apply merges in BytePairEncoding
+BACKENDS = ("python", "numpy")
+
+# Number of characters convert_text_to_array encodes at a time
+CONVERT_BLOCK_SIZE = 1 << 16
+
+# Positions added to a pair in PairCountIndex are kept in a small heap until there are more of them than this or
+# an eighth of the pair's sorted position array, then they are merged into the array
+PENDING_POSITIONS_LIMIT = 64
+
+# Marks a node of the PairCountIndex linked list that a merge removed, in place of its previous position
+REMOVED_POSITION = -2
+
+# Number of trailing chunks StreamingEncoder holds back until more text arrives. The last chunk can still grow,
+# and the one before it can still change when an alternative that ran out of input would match once more text
+# arrives (e.g. "'" followed by "l" becomes the contraction "'ll"); the GPT-2 and GPT-4 patterns never look further
+STREAM_HOLDBACK_CHUNKS = 2
+
+# Split patterns STREAM_HOLDBACK_CHUNKS is known to be enough for. With any other pattern a chunk can depend on
+# text arbitrarily far ahead (e.g. r"ab+c|." on "abbbbc"), so StreamingEncoder buffers the stream until flush
+STREAMABLE_SPLIT_PATTERNS = (GPT2_SPLIT_PATTERN, GPT4_SPLIT_PATTERN)
+
+# Binary model format written by BytePairEncoding.save: a little-endian header of magic, version, flags,
+# merge count, vocab size, split pattern length and CRC32 of everything after the header, followed by the
+# split pattern padded to 4 bytes, the merges as (left, right) uint32 pairs, a uint32 offsets table with
+# vocab size + 1 entries, and the byte blob of all vocabulary entries
+MODEL_MAGIC = b"BPEM"
+MODEL_VERSION = 1
+MODEL_HEADER = struct.Struct("<4sIIIIII")
+MODEL_FLAG_SPLIT_PATTERN = 1
+
+# Tokenizer of a batch worker process, set once by the pool initializer instead of being pickled per task
+_batch_worker_bpe = None
+
+
+def load_config(yaml_file="config.yaml"):
+    """
+    Load the configuration settings from a YAML file.
+
+    Args:
+        yaml_file (str): Path to the YAML file.
+
+    Returns:
+        dict: Parsed configuration dictionary.
+    """
+    with open(yaml_file, 'r') as file:
+        config = yaml.safe_load(file)
+    return config
+
+
+def token_typecode(vocab_size: int) -> str:
+    """Returns the array typecode of the smallest unsigned integer that can hold every token ID of a vocabulary."""
+    return "H" if vocab_size <= 1 << 16 else "I"
+
+
+def numpy_token_layout(chunks: list[bytes], frequencies: list[int], vocab_size: int):
+    """
+    Lays chunks out in one NumPy array, separated by a token ID that no merge can match.
+
+    Args:
+    - chunks: The UTF-8 bytes of every chunk.
+    - frequencies: How often each chunk occurs.
+    - vocab_size: Upper bound of the token IDs; it is used as the separator.
+
+    Returns:
+    - The tokens, and the frequency of the chunk every position belongs to.
+    """
+    lengths = np.fromiter((len(chunk) for chunk in chunks), dtype=np.int64, count=len(chunks))
+    tokens = np.frombuffer(b"".join(chunks), dtype=np.uint8).astype(token_typecode(vocab_size + 1))
+    tokens = np.insert(tokens, np.cumsum(lengths)[:-1], vocab_size)
+    weights = np.repeat(np.asarray(frequencies, dtype=np.int64), lengths + 1)[:len(tokens)]
+    return tokens, weights
+
+
+def numpy_pair_keys(tokens, vocab_size: int):
+    """
+    Packs every adjacent pair (a, b) into the single key a * vocab_size + b.
+
+    Returns:
+    - The key of every pair, and a mask of the pairs that do not touch a chunk separator.
+    """
+    left = tokens[:-1]
+    right = tokens[1:]
+    valid = (left != vocab_size) & (right != vocab_size)
+    return left.astype(np.int64) * vocab_size + right, valid
+
+
+def numpy_merge_positions(tokens, merge_pair: tuple[int, int]):
+    """
+    Finds the positions where a pair is merged, resolving overlaps like the left-to-right scan of
+    apply_merge_to_tokens: in a run such as "aaa" only every other match, starting from the left, is merged.
+    """
+    first, second = merge_pair
+    positions = np.flatnonzero((tokens[:-1] == first) & (tokens[1:] == second))
+    if first == second and len(positions) > 1:
+        offsets = np.arange(len(positions))
+        run_starts = np.ones(len(positions), dtype=bool)
+        run_starts[1:] = np.diff(positions) != 1
+        run_start_offsets = np.maximum.accumulate(np.where(run_starts, offsets, 0))
+        positions = positions[(offsets - run_start_offsets) % 2 == 0]
+    return positions
+
+
+def numpy_apply_merge(tokens, weights, merge_pair: tuple[int, int], new_token_id: int):
+    """Applies a merge to a NumPy token layout and returns the compacted tokens and weights."""
+    positions = numpy_merge_positions(tokens, merge_pair)
+    tokens[positions] = new_token_id
+    keep = np.ones(len(tokens), dtype=bool)
+    keep[positions + 1] = False
+    return tokens[keep], weights[keep]
+
+
+def pop_most_frequent_pair(queue: list, pair_counts: dict, current_key: Callable,
+                           profiler: "PhaseProfiler | None" = None) -> tuple[tuple[int, int], int]:
+    """
+    Pops the most frequent pair from a lazily updated heap of (-count, key, pair) entries.
+
+    Entries are not removed when a count or key changes. An entry whose pair no longer occurs is dropped,
+    and an entry whose count or key is out of date is pushed back with the current values, until the top
+    entry is up to date.
+
+    Args:
+    - queue: The heap of (-count, key, pair) entries.
+    - pair_counts: The current count of every pair that occurs.
+    - current_key: Returns the current tie-breaking key of a pair, e.g. its first position.
+    - profiler: A PhaseProfiler that counts the heap pops and stale entries (default is None).
+
+    Returns:
+    - The most frequent pair and its count.
+    """
+    while True:
+        if not queue:
+            raise ValueError("No token pairs are left to merge before reaching the target vocabulary size.")
+        neg_count, key, pair = heapq.heappop(queue)
+        if profiler is not None:
+            profiler.count("heap_pops")
+        pair_count = pair_counts.get(pair, 0)
+        if not pair_count:
+            continue
+        pair_key = current_key(pair)
+        if -neg_count == pair_count and key == pair_key:
+            return pair, pair_count
+        if profiler is not None:
+            profiler.count("stale_heap_entries")
+        heapq.heappush(queue, (-pair_count, pair_key, pair))
+
+
+def _init_batch_worker(bpe):
+    global _batch_worker_bpe
+    _batch_worker_bpe = bpe
+
+
+def _encode_in_batch_worker(text):
+    return _batch_worker_bpe.encode_text(text)
+
+
+def _decode_in_batch_worker(tokens):
+    return _batch_worker_bpe.decode_tokens(tokens)
+
+
+def iter_dataset_texts(dataset_path: str, split: str = "train", shard_index: int = 0, num_shards: int = 1,
+                       batch_size: int = 1000) -> Iterator[str]:
+    """
+    Yields the texts of a dataset saved with save_to_disk, e.g. by 01_preprocess_dataset.py.
+
+    The Arrow files are memory-mapped and read in batches, so only one batch is held in memory at a time.
+
+    Args:
+    - dataset_path: Directory the dataset was saved to.
+    - split: The split to read (default is "train").
+    - shard_index: Which contiguous slice of the split to read (default is 0).
+    - num_shards: Number of slices the split is cut into (default is 1, the whole split).
+    - batch_size: Number of rows read at a time (default is 1000).
+    """
+    import datasets  # only needed when reading a saved dataset
+
+    dataset = datasets.load_from_disk(dataset_path)[split]
+    if num_shards > 1:
+        dataset = dataset.shard(num_shards, shard_index, contiguous=True)
+    for batch in dataset.iter(batch_size=batch_size):
+        yield from batch["text"]
+
+
+def _run_training_shard(connection, split_pattern, typecode, chunks=None, dataset_source=None):
+    """
+    Worker process of BytePairEncoding.train_bpe_sharded.
+
+    Counts the pairs of its shard, sends the counts and first positions to the main process, then
+    applies every merge it receives and answers with the count deltas, until it receives None.
+    """
+    bpe = BytePairEncoding(split_pattern)
+    if dataset_source is not None:
+        chunk_frequencies = bpe.get_chunk_frequencies(iter_dataset_texts(*dataset_source))
+    else:
+        chunk_frequencies = Counter(chunks)
+    index = PairCountIndex((bpe.convert_text_to_array(chunk, typecode) for chunk in chunk_frequencies),
+                           list(chunk_frequencies.values()), typecode)
+    del chunk_frequencies
+
+    connection.send((index.pair_counts, {pair: index.first_position(pair) for pair in index.pair_counts}))
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        count_deltas = index.merge(*message)
+        connection.send({
+            pair: (delta, index.first_position(pair) if pair in index.pair_counts else -1)
+            for pair, delta in count_deltas.items()
+        })
+    connection.close()
+
+
+class ChunkCache:
+    """
+    A size-bounded LRU cache from the UTF-8 bytes of a chunk to its encoded token IDs.
+
+    Attributes:
+    -----------
+    max_entries : int | None
+        The maximum number of cached chunks, or None for no limit on the count.
+    max_bytes : int | None
+        The maximum total length in bytes of the cached chunks, or None for no limit on the size.
+    hits : int
+        The number of lookups that found their chunk.
+    misses : int
+        The number of lookups that did not find their chunk.
+    evictions : int
+        The number of chunks dropped to stay within the capacity.
+    """
+
+    def __init__(self, max_entries: int | None = None, max_bytes: int | None = None):
+        if max_entries is None and max_bytes is None:
+            raise ValueError("A chunk cache needs a capacity in entries, in bytes, or both.")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, chunk: bytes) -> tuple[int, ...] | None:
+        """Returns the cached tokens of a chunk and marks it as most recently used, or None on a miss."""
+        tokens = self.entries.get(chunk)
+        if tokens is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(chunk)
+        self.hits += 1
+        return tokens
+
+    def put(self, chunk: bytes, tokens: tuple[int, ...]) -> None:
+        """Caches the tokens of a chunk, evicting the least recently used chunks that no longer fit."""
+        if self.max_bytes is not None and len(chunk) > self.max_bytes:
+            return
+        if chunk in self.entries:
+            self.entries.move_to_end(chunk)
+            return
+        self.entries[chunk] = tokens
+        self.size_bytes += len(chunk)
+        while ((self.max_entries is not None and len(self.entries) > self.max_entries)
+               or (self.max_bytes is not None and self.size_bytes > self.max_bytes)):
+            evicted_chunk, _ = self.entries.popitem(last=False)
+            self.size_bytes -= len(evicted_chunk)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drops every cached chunk; the hit, miss and eviction counters are kept."""
+        self.entries.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        """Returns the counters and the current occupancy of the cache."""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "bytes": self.size_bytes,
+        }
+
+
+class PhaseProfiler:
+    """
+    Accumulates the wall time spent in each phase of training and counts the events of interest.
+
+    The trainers only touch a profiler when one is attached to the BytePairEncoding, so training
+    without profiling pays a single None check per phase and merge.
+
+    Attributes:
+    -----------
+    timings : Counter[str]
+        The total seconds spent in each phase: "pair_counting", "max_selection" and "merge_application".
+    counters : Counter[str]
+        Event counts, e.g. the number of merges, heap pops and stale heap entries.
+    """
+
+    def __init__(self):
+        self.timings = Counter()
+        self.counters = Counter()
+
+    def lap(self, phase: str, start: float) -> float:
+        """Adds the time since start to a phase and returns the current time, the start of the next phase."""
+        now = time.perf_counter()
+        self.timings[phase] += now - start
+        return now
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Adds to an event counter."""
+        self.counters[name] += amount
+
+    def reset(self) -> None:
+        """Clears every timing and counter."""
+        self.timings.clear()
+        self.counters.clear()
+
+    def stats(self) -> dict[str, dict]:
+        """Returns the timings in seconds and the counters accumulated since the last reset."""
+        return {"timings": dict(self.timings), "counters": dict(self.counters)}
+
+
+class MappedModelFile:
+    """
+    A model file written by BytePairEncoding.save, memory-mapped read-only.
+
+    The merges and the offsets table are memoryviews into the mapping, so nothing is copied when the file
+    is opened, and processes forked after loading share the same pages. The mapping stays open until close
+    is called or the with block using the file ends.
+
+    Attributes:
+    -----------
+    path : str
+        The path of the model file.
+    split_pattern : str | None
+        The split pattern the model was trained with.
+    merges : memoryview
+        Flat uint32 view of the (left, right) pair of every merge, in merge order.
+    offsets : memoryview
+        uint32 view of where every vocabulary entry starts in the blob, plus the end of the last one.
+    blob : memoryview
+        The bytes of all vocabulary entries, concatenated.
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        """
+        Args:
+        - path: The model file to open.
+        - verify: If True, checks the CRC32 of the file, which reads it once (default is True).
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.buffer) < MODEL_HEADER.size:
+            raise ValueError(f"{path} is too short to be a BPE model file.")
+        magic, version, flags, num_merges, vocab_size, pattern_length, checksum = MODEL_HEADER.unpack_from(self.buffer)
+        if magic != MODEL_MAGIC:
+            raise ValueError(f"{path} is not a BPE model file.")
+        if version != MODEL_VERSION:
+            raise ValueError(f"{path} has model format version {version}, expected {MODEL_VERSION}.")
+        payload = self.payload = memoryview(self.buffer)[MODEL_HEADER.size:]
+        if verify and zlib.crc32(payload) != checksum:
+            raise ValueError(f"{path} is corrupted, its checksum does not match.")
+
+        self.split_pattern = None
+        if flags & MODEL_FLAG_SPLIT_PATTERN:
+            self.split_pattern = bytes(payload[:pattern_length]).decode("utf-8")
+        merges_start = -(-pattern_length // 4) * 4
+        offsets_start = merges_start + 8 * num_merges
+        blob_start = offsets_start + 4 * (vocab_size + 1)
+        self.merges = payload[merges_start:offsets_start].cast("I")
+        self.offsets = payload[offsets_start:blob_start].cast("I")
+        self.blob = payload[blob_start:]
+        if sys.byteorder != "little":
+            self.merges = memoryview(MappedModelFile.swapped(self.merges))
+            self.offsets = memoryview(MappedModelFile.swapped(self.offsets))
+
+    @staticmethod
+    def swapped(view: memoryview) -> array:
+        """Copies a little-endian uint32 view into a native array, for big-endian machines."""
+        values = array("I", view.tobytes())
+        values.byteswap()
+        return values
+
+    def close(self) -> None:
+        """Unmaps the file; the views into it can no longer be used afterwards."""
+        # The mapping refuses to close while any memoryview still exports its buffer
+        for view in (self.merges, self.offsets, self.blob, self.payload):
+            view.release()
+        self.buffer.close()
+
+    def __enter__(self) -> "MappedModelFile":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __reduce__(self):
+        # Mappings cannot be pickled; a worker process maps the file again instead
+        return MappedModelFile, (self.path, False)
+
+
+class MappedVocab(Mapping):
+    """
+    Read-only vocabulary mapping token IDs to bytes, served from a memory-mapped model file.
+
+    An entry is copied out of the mapping the first time it is looked up and kept in a list, so repeated
+    lookups cost no more than with a dict vocabulary and only the tokens that are used get copied.
+    """
+
+    def __init__(self, model_file: MappedModelFile):
+        self.model_file = model_file
+        self.entries = [None] * (len(model_file.offsets) - 1)
+
+    def __getitem__(self, token_id: int) -> bytes:
+        if not 0 <= token_id < len(self.entries):
+            raise KeyError(token_id)
+        entry = self.entries[token_id]
+        if entry is None:
+            offsets = self.model_file.offsets
+            entry = self.entries[token_id] = bytes(self.model_file.blob[offsets[token_id]:offsets[token_id + 1]])
+        return entry
+
+    def join(self, tokens: Iterable[int]) -> bytes:
+        """Returns the concatenated bytes of tokens, without a Mapping lookup per token."""
+        entries = self.entries
+        size = len(entries)
+        parts = []
+        for token in tokens:
+            entry = entries[token] if 0 <= token < size else None
+            if entry is None:
+                entry = self[token]
+            parts.append(entry)
+        return b"".join(parts)
+
+    def __len__(self) -> int:
+        return len(self.model_file.offsets) - 1
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self)))
+
+
+class MappedMerges(Mapping):
+    """Read-only mapping from merge ID to token pair, served from a memory-mapped model file."""
+
+    def __init__(self, model_file: MappedModelFile):
+        self.model_file = model_file
+
+    def __getitem__(self, merge_id: int) -> tuple[int, int]:
+        if not 256 <= merge_id < 256 + len(self):
+            raise KeyError(merge_id)
+        index = 2 * (merge_id - 256)
+        return self.model_file.merges[index], self.model_file.merges[index + 1]
+
+    def __len__(self) -> int:
+        return len(self.model_file.merges) // 2
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(256, 256 + len(self)))
+
+
+class PairCountIndex:
+    """
+    Weighted pair counts over token chunks that are updated in place as merges are applied.
+
+    The chunks are laid out one after another in a doubly linked list backed by typed arrays and cut at
+    chunk boundaries, so a merge rewrites two nodes in place and never joins two chunks. Every pair keeps
+    the positions where it occurs in a sorted typed array, plus a small heap of positions added by merges
+    that is merged into the array once it grows past PENDING_POSITIONS_LIMIT or an eighth of the array.
+    Positions that stop holding the pair are left in place and skipped when they are found.
+
+    Memory is 2 bytes per token (4 for vocabularies over 65536 tokens) plus 4 bytes for each of the two
+    links and the pair positions, so about 14 bytes per input byte, and 16 bytes per chunk for its start
+    and weight; positions added by merges grow it by at most 8 bytes per merged occurrence. Python int
+    heaps of the positions used to take about 68 bytes per input byte.
+
+    Attributes:
+    -----------
+    pair_counts : dict[tuple[int, int], int]
+        The weighted count of every pair that currently occurs.
+    """
+
+    def __init__(self, chunks: Iterable[list[int] | array], frequencies: list[int] | None = None, typecode: str = "I"):
+        """
+        Args:
+        - chunks: The token lists to count pairs in. They are copied one at a time, so a generator of chunks
+          never needs them all in memory at once.
+        - frequencies: How often each chunk occurs; pair counts are weighted by it (default is None, all 1).
+        - typecode: Array typecode of the tokens, see token_typecode (default is "I").
+        """
+        if frequencies is None:
+            frequencies = itertools.repeat(1)
+
+        # One start position and one weight per non-empty chunk; the chunk of a position is found by bisection
+        self.tokens = array(typecode)
+        self.chunk_starts = array("Q")
+        self.chunk_weights = array("Q")
+        for chunk, frequency in zip(chunks, frequencies):
+            if not len(chunk):
+                continue
+            self.chunk_starts.append(len(self.tokens))
+            self.chunk_weights.append(frequency)
+            if isinstance(chunk, array) and chunk.typecode != typecode:
+                chunk = chunk.tolist()
+            self.tokens.extend(chunk)
+        size = len(self.tokens)
+        position_typecode = "i" if size < 1 << 31 else "q"
+        self.prev_pos = array(position_typecode, range(-1, size - 1))
+        self.next_pos = array(position_typecode, range(1, size + 1))
+
+        # Cut the links between the last token of a chunk and the first token of the next one
+        for chunk_start in self.chunk_starts:
+            self.prev_pos[chunk_start] = -1
+            if chunk_start:
+                self.next_pos[chunk_start - 1] = -1
+        if size:
+            self.next_pos[size - 1] = -1
+
+        # Count every pair once; positions are appended in increasing order, so each array is sorted
+        self.position_typecode = position_typecode
+        self.pair_counts = {}
+        self.pair_positions = {}
+        self.pending_positions = {}
+        chunk_ends = itertools.chain(itertools.islice(self.chunk_starts, 1, None), [size])
+        for chunk_start, chunk_end, weight in zip(self.chunk_starts, chunk_ends, self.chunk_weights):
+            for i in range(chunk_start, chunk_end - 1):
+                pair = (self.tokens[i], self.tokens[i + 1])
+                self.pair_counts[pair] = self.pair_counts.get(pair, 0) + weight
+                positions = self.pair_positions.get(pair)
+                if positions is None:
+                    positions = self.pair_positions[pair] = array(position_typecode)
+                positions.append(i)
+
+    def pair_at(self, pos: int) -> tuple[int, int] | None:
+        """Returns the pair starting at a position, or None if the position no longer starts a pair."""
+        next_pos = self.next_pos[pos]
+        if next_pos < 0 or self.prev_pos[pos] == REMOVED_POSITION:
+            return None
+        return self.tokens[pos], self.tokens[next_pos]
+
+    def weight_at(self, pos: int) -> int:
+        """Returns the weight of the chunk a position belongs to."""
+        return self.chunk_weights[bisect.bisect_right(self.chunk_starts, pos) - 1]
+
+    def first_position(self, pair: tuple[int, int]) -> int:
+        """Returns the leftmost position of a pair that currently occurs."""
+        first = -1
+        positions = self.pair_positions.get(pair)
+        if positions:
+            stale = 0
+            while stale < len(positions) and self.pair_at(positions[stale]) != pair:
+                stale += 1
+            del positions[:stale]
+            if positions:
+                first = positions[0]
+        pending = self.pending_positions.get(pair)
+        if pending:
+            while pending and self.pair_at(pending[0]) != pair:
+                heapq.heappop(pending)
+            if pending and (first < 0 or pending[0] < first):
+                first = pending[0]
+        return first
+
+    def iter_positions(self, pair: tuple[int, int]) -> Iterator[int]:
+        """Yields every recorded position of a pair in increasing order, including stale ones."""
+        return heapq.merge(self.pair_positions.get(pair, ()), sorted(self.pending_positions.get(pair, ())))
+
+    def remove_pair(self, pair: tuple[int, int], weight: int) -> None:
+        self.pair_counts[pair] -= weight
+        if not self.pair_counts[pair]:
+            del self.pair_counts[pair]
+            self.pair_positions.pop(pair, None)
+            self.pending_positions.pop(pair, None)
+
+    def add_pair(self, pair: tuple[int, int], pos: int, weight: int) -> None:
+        self.pair_counts[pair] = self.pair_counts.get(pair, 0) + weight
+        pending = self.pending_positions.setdefault(pair, [])
+        heapq.heappush(pending, pos)
+        positions = self.pair_positions.get(pair, ())
+        if len(pending) > max(PENDING_POSITIONS_LIMIT, len(positions) >> 3):
+            self.pair_positions[pair] = array(self.position_typecode, self.iter_positions(pair))
+            del self.pending_positions[pair]
+
+    def merge(self, merge_pair: tuple[int, int], new_token_id: int) -> dict[tuple[int, int], int]:
+        """
+        Replaces every occurrence of a pair with a new token, left to right like apply_merge_to_tokens.
+
+        Args:
+        - merge_pair: The token pair to merge.
+        - new_token_id: The ID of the merged token.
+
+        Returns:
+        - The change in count of every pair the merge touched, including the merged pair itself.
+        """
+        tokens = self.tokens
+        prev_pos = self.prev_pos
+        next_pos = self.next_pos
+        count_deltas = {}
+
+        def change(pair, delta):
+            count_deltas[pair] = count_deltas.get(pair, 0) + delta
+
+        # Positions consumed by an earlier overlapping match no longer hold the pair and are skipped
+        for pos in self.iter_positions(merge_pair):
+            if self.pair_at(pos) != merge_pair:
+                continue
+            right_pos = next_pos[pos]
+            before_pos = prev_pos[pos]
+            after_pos = next_pos[right_pos]
+            weight = self.weight_at(pos)
+
+            old_pairs = [merge_pair]
+            if before_pos >= 0:
+                old_pairs.append((tokens[before_pos], tokens[pos]))
+            if after_pos >= 0:
+                old_pairs.append((tokens[right_pos], tokens[after_pos]))
+            for old_pair in old_pairs:
+                self.remove_pair(old_pair, weight)
+                change(old_pair, -weight)
+
+            tokens[pos] = new_token_id
+            prev_pos[right_pos] = REMOVED_POSITION
+            next_pos[pos] = after_pos
+            if after_pos >= 0:
+                prev_pos[after_pos] = pos
+
+            if before_pos >= 0:
+                new_pair = (tokens[before_pos], new_token_id)
+                self.add_pair(new_pair, before_pos, weight)
+                change(new_pair, weight)
+            if after_pos >= 0:
+                new_pair = (new_token_id, tokens[after_pos])
+                self.add_pair(new_pair, pos, weight)
+                change(new_pair, weight)
+
+        return count_deltas
+
+
+class StreamingEncoder:
+    """
+    Encodes text that arrives in pieces, emitting token IDs as soon as they can no longer change.
+
+    Bytes are decoded incrementally, so a multi-byte UTF-8 character split across pieces is carried over.
+    Since merges never cross chunk boundaries, with one of the STREAMABLE_SPLIT_PATTERNS the tokens of a
+    chunk are final once the pattern has matched STREAM_HOLDBACK_CHUNKS more chunks after it; the held-back
+    text is re-split with the next piece. Any other pattern may decide a chunk on text arbitrarily far
+    ahead, and without a split pattern the whole stream is a single chunk, so in both cases the text is
+    buffered and every token is emitted by flush. Either way, the concatenated output of feed and flush
+    equals encode_text on the whole input.
+
+    Attributes:
+    -----------
+    bpe : BytePairEncoding
+        The tokenizer whose split pattern and merges are used.
+    pending : str
+        The decoded text whose tokens may still change, when streaming with a streamable pattern.
+    buffered : list[str]
+        The decoded pieces kept until flush otherwise, joined once there instead of on every feed.
+    """
+
+    def __init__(self, bpe: "BytePairEncoding"):
+        self.bpe = bpe
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.pending = ""
+        self.buffered = []
+
+    def feed(self, data: str | bytes) -> list[int]:
+        """Adds the next piece of the stream and returns the token IDs that became final."""
+        if isinstance(data, str):
+            if self.decoder.getstate()[0]:
+                raise ValueError("Cannot feed text while a partial UTF-8 character from earlier bytes is pending.")
+            text = data
+        else:
+            text = self.decoder.decode(data)
+
+        if self.bpe.split_pattern not in STREAMABLE_SPLIT_PATTERNS:
+            self.buffered.append(text)
+            return []
+        self.pending += text
+        matches = list(self.bpe.split_regex.finditer(self.pending))
+        if len(matches) <= STREAM_HOLDBACK_CHUNKS:
+            return []
+        final_chunks = [match.group() for match in matches[:-STREAM_HOLDBACK_CHUNKS]]
+        self.pending = self.pending[matches[-STREAM_HOLDBACK_CHUNKS].start():]
+        return self.bpe.encode_text_chunks(final_chunks)
+
+    def flush(self) -> list[int]:
+        """Ends the stream and returns the remaining token IDs; raises UnicodeDecodeError on truncated UTF-8."""
+        self.buffered.append(self.decoder.decode(b"", final=True))
+        text = self.pending + "".join(self.buffered)
+        self.pending = ""
+        self.buffered = []
+        return self.bpe.encode_text(text)
+
+
+class StreamingDecoder:
+    """
+    Decodes token IDs that arrive in pieces, never splitting a multi-byte UTF-8 character.
+
+    The bytes of an incomplete character are carried over to the next piece. The concatenated output of
+    feed and flush equals decode_tokens on all the tokens.
+
+    Attributes:
+    -----------
+    bpe : BytePairEncoding
+        The tokenizer whose vocabulary is used.
+    """
+
+    def __init__(self, bpe: "BytePairEncoding"):
+        self.bpe = bpe
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def feed(self, tokens: Iterable[int]) -> str:
+        """Adds the next token IDs and returns the text of every character they completed."""
+        return self.decoder.decode(self.bpe.token_bytes(tokens))
+
+    def flush(self) -> str:
+        """Ends the stream and returns the remaining text, with a replacement character for truncated UTF-8."""
+        return self.decoder.decode(b"", final=True)
+
+
 class BytePairEncoding:
     """
     A class that implements Byte Pair Encoding (BPE) for text compression and tokenization.
 
     Attributes:
     -----------
-    vocab : dict[int, bytes]
+    vocab : dict[int, bytes] | MappedVocab
         The vocabulary that maps token IDs to byte sequences.
     merges : dict[tuple[int, int], int]
         Stores the merge operations as token pairs with their assigned IDs.
-    reverse_merges : dict[int, tuple[int, int]]
+    reverse_merges : dict[int, tuple[int, int]] | MappedMerges
         Reverse mapping of the merges for encoding.
+    split_pattern : str | None
+        Regex used to split text into chunks before training and encoding, or None to treat the text as one chunk.
+    cache : ChunkCache | None
+        LRU cache of encoded chunks, or None when caching is disabled.
+    backend : str
+        Either "python" or "numpy", the implementation used to count pairs and apply merges.
+    profiler : PhaseProfiler | None
+        Per-phase timers and counters of the trainers, or None when profiling is disabled.
 
     Methods:
     --------
     convert_text_to_bytes(text: str) -> list[int]:
         Converts a string of text into a list of UTF-8 encoded bytes.
 
-    get_pair_statistics(tokens: list[int]) -> dict[tuple[int, int], int]:
+    convert_text_to_array(text: str, typecode: str = "H") -> array:
+        Converts a string of text into a compact typed array of UTF-8 encoded bytes.
+
+    set_split_pattern(split_pattern: str | None) -> None:
+        Sets the regex used to split text into chunks, or None to treat the text as one chunk.
+
+    split_text(text: str) -> list[str]:
+        Splits the text into chunks with the split pattern; merges never cross chunk boundaries.
+
+    get_chunk_frequencies(documents: str | Iterable[str], max_unique_chunks: int | None = None) -> Counter[str]:
+        Streams documents into a count of their unique chunks, optionally bounded in size.
+
+    prune_chunk_frequencies(chunk_frequencies: Counter[str], max_unique_chunks: int) -> Counter[str]:
+        Keeps the most frequent half of the allowed chunks, in their original order.
+
+    get_pair_statistics(tokens: list[int], pair_stats: dict | None = None, weight: int = 1) -> dict[tuple[int, int], int]:
         Generates frequency statistics of byte pairs in a given list of tokens.
 
     find_most_frequent_pair(pair_stats: dict[tuple[int, int], int]) -> tuple[int, int]:
         Finds the most frequent byte pair in the given statistics.
 
+    invalidate_cache() -> None:
+        Drops every cached chunk encoding, as they are stale once the merges change.
+
     add_merge(token_pair: tuple[int, int]) -> None:
         Adds a merged token pair to the vocabulary and updates the merge history.
 
-    apply_merge_to_tokens(tokens: list[int], merge_pair: tuple[int, int], new_token_id: int) -> list[int]:
-        Applies a token merge to a list of tokens, replacing consecutive token pairs with a new token.
+    apply_merge_to_tokens(tokens: list[int] | array, merge_pair: tuple[int, int], new_token_id: int) -> list[int] | array:
+        Applies a token merge in place, replacing consecutive token pairs with a new token.
 
-    train_bpe(text: str, target_vocab_size: int) -> None:
+    train_bpe(text: str | Iterable[str], target_vocab_size: int, verbose: bool = False, incremental: bool = False, max_unique_chunks: int | None = None) -> None:
         Trains the BPE algorithm on the given text to build a vocabulary and merge operations.
 
-    encode_text(text: str) -> list[int]:
+    train_bpe_incremental(chunks: Iterable[list[int] | array], target_vocab_size: int, verbose: bool = False, frequencies: list[int] | None = None) -> None:
+        Learns merges from token chunks by updating pair counts only around the merged positions.
+
+    train_bpe_numpy(chunks: list[bytes], target_vocab_size: int, verbose: bool = False, frequencies: list[int] | None = None) -> None:
+        Learns merges with vectorised pair counting and merge application.
+
+    train_bpe_sharded(text: str | None, target_vocab_size: int, num_shards: int | None = None, verbose: bool = False, dataset_path: str | None = None, dataset_split: str = "train") -> None:
+        Trains the BPE algorithm with the pair statistics sharded across worker processes.
+
+    encode_chunk(tokens: list[int]) -> list[int]:
+        Merges a chunk of tokens by always applying the lowest-ranked merge that occurs in it.
+
+    encode_chunk_reference(tokens: list[int]) -> list[int]:
+        Merges a chunk of tokens by applying every learned merge in order over the whole chunk.
+
+    encode_text(text: str, as_array: bool = False) -> list[int] | array:
         Encodes the text using the learned merges from BPE.
 
+    encode_text_chunks(chunks: list[str], as_array: bool = False) -> list[int] | array:
+        Encodes text that has already been split into chunks.
+
+    encode_text_reference(text: str) -> list[int]:
+        Encodes the text with the slower merge-by-merge reference path.
+
     decode_tokens(tokens: list[int]) -> str:
         Decodes a list of tokens back into text using the vocabulary.
+
+    token_bytes(tokens: Iterable[int]) -> bytes:
+        Returns the concatenated bytes of a sequence of tokens.
+
+    map_batch(worker_function: Callable, local_function: Callable, items: list, batch_size: int, num_workers: int | None = None, chunksize: int | None = None) -> Iterator:
+        Maps a function over a batch in a process pool, or in-process when the batch is small.
+
+    encode_batch(texts: Iterable[str], num_workers: int | None = None, chunksize: int | None = None) -> Iterator[list[int]]:
+        Encodes many texts across a process pool, yielding the results in input order.
+
+    decode_batch(token_lists: Iterable[list[int]], num_workers: int | None = None, chunksize: int | None = None) -> Iterator[str]:
+        Decodes many token lists across a process pool, yielding the results in input order.
+
+    encode_stream(pieces: Iterable[str | bytes]) -> Iterator[list[int]]:
+        Encodes a stream of text or byte pieces, yielding token IDs as soon as they are final.
+
+    encode_stream_async(pieces: AsyncIterable[str | bytes]) -> AsyncIterator[list[int]]:
+        Asynchronous form of encode_stream for asyncio pipelines.
+
+    decode_stream(token_lists: Iterable[list[int]]) -> Iterator[str]:
+        Decodes a stream of token lists, yielding text without splitting multi-byte characters.
+
+    decode_stream_async(token_lists: AsyncIterable[list[int]]) -> AsyncIterator[str]:
+        Asynchronous form of decode_stream for asyncio pipelines.
+
+    save(path: str) -> None:
+        Saves the model in the compact binary model format.
+
+    load(path: str, verify: bool = True) -> None:
+        Loads a model saved with save, memory-mapping it instead of reading it into Python objects.
+
+    close() -> None:
+        Unmaps the model file opened by load, if any.
+
+    export_vocab(path: str) -> None:
+        Writes a human-readable listing of the merges and the vocabulary.
     """
 
-    def __init__(self):
+    def __init__(self, split_pattern: str | None = None, cache_max_entries: int | None = None,
+                 cache_max_bytes: int | None = None, backend: str = "python", profile: bool = False):
+        """
+        Args:
+        - split_pattern: Regex used to pre-tokenize text into chunks, e.g. GPT2_SPLIT_PATTERN or
+          GPT4_SPLIT_PATTERN (default is None, which trains and encodes the text as a single chunk).
+        - cache_max_entries: Number of encoded chunks to keep in an LRU cache (default is None).
+        - cache_max_bytes: Total length in bytes of the chunks to keep in an LRU cache (default is None).
+          The cache is only enabled when at least one of the two capacities is given.
+        - backend: "python" or "numpy" (default is "python"). The NumPy backend trains by packing adjacent
+          pairs into int64 keys and counting and merging them with vectorised operations; the results are
+          identical. It only speeds up the full-recount trainer: encoding always uses encode_chunk, which is
+          several times faster than recounting whole arrays per merge, and the incremental and sharded
+          trainers always run in Python.
+        - profile: If True, the trainers record per-phase timings and counters in self.profiler, which
+          accumulate over training runs until profiler.reset() is called (default is False).
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}.")
+        if backend == "numpy" and np is None:
+            raise ImportError("The numpy backend requires NumPy to be installed.")
+        self.backend = backend
         self.vocab = {}
         self.merges = {}
         self.reverse_merges = {}
+        self.set_split_pattern(split_pattern)
+        self.cache = None
+        if cache_max_entries is not None or cache_max_bytes is not None:
+            self.cache = ChunkCache(cache_max_entries, cache_max_bytes)
+        self.profiler = PhaseProfiler() if profile else None
+
+    def set_split_pattern(self, split_pattern: str | None) -> None:
+        """Sets the regex used to split text into chunks, or None to treat the text as one chunk."""
+        self.split_pattern = split_pattern
+        self.split_regex = None
+        if split_pattern is not None:
+            # The stdlib re module is only good enough for patterns without \p{...} classes
+            self.split_regex = regex.compile(split_pattern) if regex is not None else re.compile(split_pattern)
+
+    def split_text(self, text: str) -> list[str]:
+        """Splits the text into chunks with the split pattern; merges never cross chunk boundaries."""
+        if self.split_regex is None:
+            return [text]
+        return self.split_regex.findall(text)
+
+    def get_chunk_frequencies(self, documents: str | Iterable[str], max_unique_chunks: int | None = None) -> Counter:
+        """
+        Streams documents into a count of their unique chunks, optionally bounded in size.
+
+        Only the counts are kept, so memory grows with the number of distinct chunks rather than with the
+        length of the corpus. Without a split pattern every document is a single chunk.
+
+        Args:
+        - documents: A single text, or an iterable of documents such as a generator or iter_dataset_texts.
+        - max_unique_chunks: Memory ceiling on the number of distinct chunks kept (default is None, no limit).
+          When it is exceeded the rarest chunks are dropped, so the counts become approximate. It is ignored
+          without a split pattern, where pruning would drop whole documents from the corpus.
+
+        Returns:
+        - A Counter of chunk -> frequency, in order of first appearance.
+        """
+        if isinstance(documents, str):
+            documents = [documents]
+        chunk_frequencies = Counter()
+        for document in documents:
+            chunk_frequencies.update(self.split_text(document))
+            if (max_unique_chunks is not None and self.split_regex is not None
+                    and len(chunk_frequencies) > max_unique_chunks):
+                chunk_frequencies = self.prune_chunk_frequencies(chunk_frequencies, max_unique_chunks)
+        return chunk_frequencies
+
+    def prune_chunk_frequencies(self, chunk_frequencies: Counter, max_unique_chunks: int) -> Counter:
+        """
+        Keeps the most frequent half of the allowed chunks, in their original order.
+
+        Pruning down to half of the ceiling leaves room for new chunks, so pruning happens rarely.
+        """
+        kept_chunks = {chunk for chunk, _ in chunk_frequencies.most_common(max(1, max_unique_chunks // 2))}
+        return Counter({chunk: count for chunk, count in chunk_frequencies.items() if chunk in kept_chunks})
 
     def convert_text_to_bytes(self, text: str) -> list[int]:
         """Converts a string of text into a list of UTF-8 encoded bytes."""
         return list(text.encode("utf-8"))
 
-    def get_pair_statistics(self, tokens: list[int]) -> dict[tuple[int, int], int]:
-        """Generates frequency statistics of byte pairs in a given list of tokens."""
-        pair_stats = {}
+    def convert_text_to_array(self, text: str, typecode: str = "H") -> array:
+        """
+        Converts a string of text into a compact typed array of UTF-8 encoded bytes.
+
+        Args:
+        - text: The text to convert.
+        - typecode: The unsigned array typecode to store the tokens as, see token_typecode (default is "H").
+
+        Returns:
+        - An array with one element per UTF-8 byte.
+        """
+        tokens = array(typecode)
+        itemsize = tokens.itemsize
+        low_byte = 0 if sys.byteorder == "little" else itemsize - 1
+
+        # Encode the text a block at a time and widen every block by writing its bytes into the low byte
+        # of zeroed elements, so neither the whole encoded text nor a Python int per byte is ever held
+        for start in range(0, len(text), CONVERT_BLOCK_SIZE):
+            text_bytes = text[start:start + CONVERT_BLOCK_SIZE].encode("utf-8")
+            end = len(tokens) * itemsize
+            tokens.frombytes(bytes(itemsize * len(text_bytes)))
+            with memoryview(tokens) as view, view.cast("B") as byte_view:
+                byte_view[end + low_byte::itemsize] = text_bytes
+        return tokens
+
+    def get_pair_statistics(self, tokens: list[int], pair_stats: dict | None = None, weight: int = 1) -> dict[tuple[int, int], int]:
+        """
+        Generates frequency statistics of byte pairs in a given list of tokens.
+
+        Args:
+        - tokens: The list of tokens to count pairs in.
+        - pair_stats: Existing statistics to add the counts to (default is None, which starts a new dict).
+        - weight: How much every occurrence counts, e.g. the frequency of a chunk (default is 1).
+
+        Returns:
+        - A dict mapping each pair to its count, in order of first occurrence.
+        """
+        if pair_stats is None:
+            pair_stats = {}
         for i in range(len(tokens) - 1):
             pair = (tokens[i], tokens[i + 1])
-            pair_stats[pair] = pair_stats.get(pair, 0) + 1
+            pair_stats[pair] = pair_stats.get(pair, 0) + weight
         return pair_stats
 
     def find_most_frequent_pair(self, pair_stats: dict[tuple[int, int], int]) -> tuple[int, int]:
         """Finds the most frequent byte pair in the given statistics."""
         return max(pair_stats, key=pair_stats.get)
 
+    def invalidate_cache(self) -> None:
+        """Drops every cached chunk encoding, as they are stale once the merges change."""
+        if self.cache is not None:
+            self.cache.clear()
+
     def add_merge(self, token_pair: tuple[int, int]) -> None:
         """
         Adds a merged token pair to the vocabulary and updates the merge history.
@@ -68,63 +1029,458 @@ class BytePairEncoding:
         Args:
         - token_pair: The token pair to merge.
         """
+        self.invalidate_cache()
         merge_id = len(self.vocab)
         self.merges[token_pair] = merge_id
         self.vocab[merge_id] = self.vocab[token_pair[0]] + self.vocab[token_pair[1]]
 
-    def apply_merge_to_tokens(self, tokens: list[int], merge_pair: tuple[int, int], new_token_id: int) -> list[int]:
-        """Applies a token merge to a list of tokens, replacing consecutive token pairs with a new token."""
-        new_tokens = []
-        i = 0
-        while i < len(tokens):
-            if i < len(tokens) - 1 and tokens[i] == merge_pair[0] and tokens[i + 1] == merge_pair[1]:
-                new_tokens.append(new_token_id)
-                i += 2
+    def apply_merge_to_tokens(self, tokens: list[int] | array, merge_pair: tuple[int, int],
+                              new_token_id: int) -> list[int] | array:
+        """
+        Applies a token merge in place, replacing consecutive token pairs with a new token.
+
+        A write cursor trails the read cursor and compacts the sequence as pairs are merged, so no second
+        sequence is built; the sequence is truncated to its new length at the end.
+
+        Args:
+        - tokens: The list or array of tokens to merge in; it is modified.
+        - merge_pair: The token pair to merge.
+        - new_token_id: The ID of the merged token.
+
+        Returns:
+        - The same tokens object, after the merge.
+        """
+        first, second = merge_pair
+        length = len(tokens)
+        read = 0
+        write = 0
+        while read < length:
+            if read < length - 1 and tokens[read] == first and tokens[read + 1] == second:
+                tokens[write] = new_token_id
+                read += 2
             else:
-                new_tokens.append(tokens[i])
-                i += 1
-        return new_tokens
+                tokens[write] = tokens[read]
+                read += 1
+            write += 1
+        del tokens[write:]
+        return tokens
 
-    def train_bpe(self, text: str, target_vocab_size: int, verbose: bool = False) -> None:
+    def train_bpe(self, text: str | Iterable[str], target_vocab_size: int, verbose: bool = False,
+                  incremental: bool = False, max_unique_chunks: int | None = None) -> None:
         """
         Trains the BPE algorithm on the given text to build a vocabulary and merge operations.
 
         Args:
-        - text: The input text to train on.
+        - text: The input text to train on, or an iterable of documents that is consumed as a stream,
+          e.g. iter_dataset_texts over the dataset saved by 01_preprocess_dataset.py.
         - target_vocab_size: The desired size of the vocabulary.
         - verbose: If True, prints information about the merge process (default is False).
+        - incremental: If True, counts pairs once and updates the counts after every merge instead of
+          recounting the whole token list (default is False). The learned merges are identical.
+        - max_unique_chunks: Memory ceiling on the distinct chunks kept while streaming, see
+          get_chunk_frequencies (default is None, no limit). Ignored without a split pattern, as every
+          document is a chunk of its own and pruning would drop whole documents.
+
+        With a split pattern the text is collapsed into unique chunks first, pairs are counted once per
+        chunk and weighted by how often the chunk occurs, and merges never cross chunk boundaries.
+        Documents are chunks of their own, so merges never cross documents either.
         """
-        tokens = self.convert_text_to_bytes(text)
+        if isinstance(text, str) and self.split_regex is None:
+            chunk_texts = [text]
+            frequencies = [1]
+        else:
+            chunk_frequencies = self.get_chunk_frequencies(text, max_unique_chunks)
+            chunk_texts = list(chunk_frequencies)
+            frequencies = list(chunk_frequencies.values())
+            del chunk_frequencies
         self.vocab = {idx: bytes([idx]) for idx in range(256)}  # Initialize the first 256 possible byte values
         self.merges = {}
+        self.invalidate_cache()
+
+        typecode = token_typecode(target_vocab_size)
+        if incremental:
+            chunks = (self.convert_text_to_array(chunk, typecode) for chunk in chunk_texts)
+            self.train_bpe_incremental(chunks, target_vocab_size, verbose, frequencies)
+        elif self.backend == "numpy":
+            self.train_bpe_numpy([chunk.encode("utf-8") for chunk in chunk_texts], target_vocab_size, verbose, frequencies)
+        else:
+            chunks = [self.convert_text_to_array(chunk, typecode) for chunk in chunk_texts]
+            profiler = self.profiler
+            while len(self.vocab) < target_vocab_size:
+                if profiler is not None:
+                    start = time.perf_counter()
+                pair_stats = {}
+                for chunk, frequency in zip(chunks, frequencies):
+                    self.get_pair_statistics(chunk, pair_stats, frequency)
+                if profiler is not None:
+                    start = profiler.lap("pair_counting", start)
+                    profiler.count("pairs_counted", len(pair_stats))
+                most_frequent_pair = self.find_most_frequent_pair(pair_stats)
+                self.add_merge(most_frequent_pair)
+                if profiler is not None:
+                    start = profiler.lap("max_selection", start)
+                for chunk in chunks:
+                    self.apply_merge_to_tokens(chunk, most_frequent_pair, len(self.vocab) - 1)
+                if profiler is not None:
+                    profiler.lap("merge_application", start)
+                    profiler.count("merges")
+
+                # Print information about the merge if verbose mode is on
+                if verbose:
+                    pair_count = pair_stats[most_frequent_pair]
+                    print(f"Merged pair {most_frequent_pair} into new token {len(self.vocab) - 1}. Occurs {pair_count} times.")
+
+        self.reverse_merges = {value: key for key, value in self.merges.items()}
+
+    def train_bpe_incremental(self, chunks: Iterable[list[int] | array], target_vocab_size: int, verbose: bool = False,
+                              frequencies: list[int] | None = None) -> None:
+        """
+        Learns merges from token chunks by updating pair counts only around the merged positions.
+
+        The pair counts and positions are kept in a PairCountIndex, and a max-heap keyed on
+        (count, first position) replaces the full max() over the pair statistics. Heap entries are not
+        removed when a count drops; stale entries are detected and re-queued when they are popped.
+        Ranking on the first position reproduces the tie-breaking of find_most_frequent_pair, which
+        returns the pair that was seen first when scanning the tokens from the left.
+
+        Args:
+        - chunks: The token lists to train on, e.g. a generator; they are copied into the index one at a time.
+          The vocabulary must already contain every token in them.
+        - target_vocab_size: The desired size of the vocabulary.
+        - verbose: If True, prints information about the merge process (default is False).
+        - frequencies: How often each chunk occurs; pair counts are weighted by it (default is None, all 1).
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        index = PairCountIndex(chunks, frequencies, token_typecode(target_vocab_size))
+        queue = [(-count, index.first_position(pair), pair) for pair, count in index.pair_counts.items()]
+        heapq.heapify(queue)
+        if profiler is not None:
+            start = profiler.lap("pair_counting", start)
+            profiler.count("pairs_counted", len(queue))
 
         while len(self.vocab) < target_vocab_size:
-            pair_stats = self.get_pair_statistics(tokens)
-            most_frequent_pair = self.find_most_frequent_pair(pair_stats)
+            pair, pair_count = pop_most_frequent_pair(queue, index.pair_counts, index.first_position, profiler)
+
+            self.add_merge(pair)
+            new_token_id = len(self.vocab) - 1
+            if profiler is not None:
+                start = profiler.lap("max_selection", start)
+            count_deltas = index.merge(pair, new_token_id)
+            if profiler is not None:
+                start = profiler.lap("merge_application", start)
+                profiler.count("merges")
+                profiler.count("pairs_counted", len(count_deltas))
+
+            # Re-queue the pairs the merge touched; entries of pairs that only lost occurrences would be
+            # fixed up lazily anyway, but re-queueing them too keeps this loop simple
+            for changed_pair in count_deltas:
+                if changed_pair in index.pair_counts:
+                    heapq.heappush(queue, (-index.pair_counts[changed_pair], index.first_position(changed_pair), changed_pair))
+            if profiler is not None:
+                start = profiler.lap("pair_counting", start)
+
+            # Print information about the merge if verbose mode is on
+            if verbose:
+                print(f"Merged pair {pair} into new token {new_token_id}. Occurs {pair_count} times.")
+
+        self.reverse_merges = {value: key for key, value in self.merges.items()}
+
+    def train_bpe_numpy(self, chunks: list[bytes], target_vocab_size: int, verbose: bool = False,
+                        frequencies: list[int] | None = None) -> None:
+        """
+        Learns merges with vectorised pair counting and merge application.
+
+        Every iteration recounts all pairs like the Python loop in train_bpe, but with np.unique over
+        int64 pair keys. Among the most frequent pairs the one whose key first occurs earliest is chosen,
+        which is the pair find_most_frequent_pair returns, so the merges are identical.
+
+        Args:
+        - chunks: The UTF-8 bytes of the chunks to train on.
+        - target_vocab_size: The desired size of the vocabulary.
+        - verbose: If True, prints information about the merge process (default is False).
+        - frequencies: How often each chunk occurs; pair counts are weighted by it (default is None, all 1).
+        """
+        if frequencies is None:
+            frequencies = [1] * len(chunks)
+        tokens, weights = numpy_token_layout(chunks, frequencies, target_vocab_size)
+        profiler = self.profiler
+
+        while len(self.vocab) < target_vocab_size:
+            if profiler is not None:
+                start = time.perf_counter()
+            keys, valid = numpy_pair_keys(tokens, target_vocab_size)
+            unique_keys, first_indices, inverse = np.unique(keys[valid], return_index=True, return_inverse=True)
+            if not len(unique_keys):
+                raise ValueError("No token pairs are left to merge before reaching the target vocabulary size.")
+            counts = np.bincount(inverse.ravel(), weights=weights[:-1][valid]).astype(np.int64)
+            if profiler is not None:
+                start = profiler.lap("pair_counting", start)
+                profiler.count("pairs_counted", len(unique_keys))
+            candidates = np.flatnonzero(counts == counts.max())
+            best = candidates[np.argmin(first_indices[candidates])]
+            most_frequent_pair = divmod(int(unique_keys[best]), target_vocab_size)
+
             self.add_merge(most_frequent_pair)
-            tokens = self.apply_merge_to_tokens(tokens, most_frequent_pair, len(self.vocab) - 1)
+            if profiler is not None:
+                start = profiler.lap("max_selection", start)
+            tokens, weights = numpy_apply_merge(tokens, weights, most_frequent_pair, len(self.vocab) - 1)
+            if profiler is not None:
+                profiler.lap("merge_application", start)
+                profiler.count("merges")
 
             # Print information about the merge if verbose mode is on
             if verbose:
-                pair_count = pair_stats[most_frequent_pair]
-                print(f"Merged pair {most_frequent_pair} into new token {len(self.vocab) - 1}. Occurs {pair_count} times.")
+                print(f"Merged pair {most_frequent_pair} into new token {len(self.vocab) - 1}. Occurs {counts[best]} times.")
 
         self.reverse_merges = {value: key for key, value in self.merges.items()}
 
+    def train_bpe_sharded(self, text: str | None, target_vocab_size: int, num_shards: int | None = None,
+                          verbose: bool = False, dataset_path: str | None = None, dataset_split: str = "train") -> None:
+        """
+        Trains the BPE algorithm with the pair statistics sharded across worker processes.
+
+        Each shard keeps a PairCountIndex over its own chunks. The main process sums the shard counts,
+        picks the best pair, sends the merge to every shard and sums the count deltas they send back.
+        A pair is ranked on (count, shard, first position in that shard), which orders pairs the same
+        way as the first occurrence in the whole corpus, so the merges are the same as those learned by
+        train_bpe on the same text.
+
+        Args:
+        - text: The input text to train on; it is split into chunks that are divided between the shards.
+          Must be None when dataset_path is given. Sharding a text needs a split pattern: without one the
+          text is a single chunk that cannot be divided, so more than one shard raises a ValueError.
+        - target_vocab_size: The desired size of the vocabulary.
+        - num_shards: Number of worker processes (default is None, which uses every CPU).
+        - verbose: If True, prints information about the merge process (default is False).
+        - dataset_path: Directory of a dataset saved with save_to_disk. Every shard reads and splits only
+          its own contiguous slice of the split, so the corpus never has to fit in one process
+          (default is None).
+        - dataset_split: The split of the saved dataset to train on (default is "train").
+        """
+        if (text is None) == (dataset_path is None):
+            raise ValueError("Pass either the text or a dataset_path to train on, not both.")
+        if num_shards is None:
+            num_shards = os.cpu_count() or 1
+        if dataset_path is None:
+            if self.split_regex is None and num_shards > 1:
+                raise ValueError("Sharding a text needs a split pattern; without one the whole text is a single chunk "
+                                 "that would all go to one shard.")
+            chunks = self.split_text(text)
+            shard_size = -(-len(chunks) // num_shards)
+            shard_arguments = [{"chunks": chunks[i * shard_size:(i + 1) * shard_size]} for i in range(num_shards)]
+            del chunks
+        else:
+            shard_arguments = [{"dataset_source": (dataset_path, dataset_split, i, num_shards)} for i in range(num_shards)]
+
+        self.vocab = {idx: bytes([idx]) for idx in range(256)}  # Initialize the first 256 possible byte values
+        self.merges = {}
+        self.invalidate_cache()
+
+        typecode = token_typecode(target_vocab_size)
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        connections = []
+        processes = []
+        try:
+            for arguments in shard_arguments:
+                connection, worker_connection = multiprocessing.Pipe()
+                process = multiprocessing.Process(target=_run_training_shard, args=(worker_connection, self.split_pattern, typecode),
+                                                  kwargs=arguments, daemon=True)
+                process.start()
+                worker_connection.close()
+                connections.append(connection)
+                processes.append(process)
+            del shard_arguments
+
+            # Sum the shard counts; first_positions maps each pair to {shard index: first position}
+            pair_counts = {}
+            first_positions = {}
+            for shard_index, connection in enumerate(connections):
+                shard_counts, shard_first_positions = connection.recv()
+                for pair, count in shard_counts.items():
+                    pair_counts[pair] = pair_counts.get(pair, 0) + count
+                    first_positions.setdefault(pair, {})[shard_index] = shard_first_positions[pair]
+
+            def first_key(pair):
+                return min(first_positions[pair].items())
+
+            queue = [(-count, first_key(pair), pair) for pair, count in pair_counts.items()]
+            heapq.heapify(queue)
+            if profiler is not None:
+                start = profiler.lap("pair_counting", start)
+                profiler.count("pairs_counted", len(queue))
+
+            while len(self.vocab) < target_vocab_size:
+                pair, pair_count = pop_most_frequent_pair(queue, pair_counts, first_key, profiler)
+
+                self.add_merge(pair)
+                new_token_id = len(self.vocab) - 1
+                if profiler is not None:
+                    start = profiler.lap("max_selection", start)
+
+                # Every shard applies the merge concurrently before the deltas are collected
+                for connection in connections:
+                    connection.send((pair, new_token_id))
+                changed_pairs = set()
+                for shard_index, connection in enumerate(connections):
+                    for changed_pair, (delta, first_position) in connection.recv().items():
+                        pair_counts[changed_pair] = pair_counts.get(changed_pair, 0) + delta
+                        shard_first_positions = first_positions.setdefault(changed_pair, {})
+                        if first_position < 0:
+                            shard_first_positions.pop(shard_index, None)
+                        else:
+                            shard_first_positions[shard_index] = first_position
+                        changed_pairs.add(changed_pair)
+                if profiler is not None:
+                    start = profiler.lap("merge_application", start)
+                    profiler.count("merges")
+                    profiler.count("pairs_counted", len(changed_pairs))
+
+                for changed_pair in changed_pairs:
+                    if pair_counts[changed_pair]:
+                        heapq.heappush(queue, (-pair_counts[changed_pair], first_key(changed_pair), changed_pair))
+                    else:
+                        del pair_counts[changed_pair]
+                        del first_positions[changed_pair]
+                if profiler is not None:
+                    start = profiler.lap("pair_counting", start)
+
+                # Print information about the merge if verbose mode is on
+                if verbose:
+                    print(f"Merged pair {pair} into new token {new_token_id}. Occurs {pair_count} times.")
+        finally:
+            for connection in connections:
+                try:
+                    connection.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+                connection.close()
+            for process in processes:
+                process.join()
+
+        self.reverse_merges = {value: key for key, value in self.merges.items()}
+
+    def encode_chunk(self, tokens: list[int]) -> list[int]:
+        """
+        Merges a chunk of tokens by always applying the lowest-ranked merge that occurs in it.
+
+        A merge id is also its rank, and a merge can never create a pair that ranks lower than itself,
+        so popping (merge id, position) entries from a priority queue over the adjacent pairs of a doubly
+        linked token list performs the same merges as encode_chunk_reference, in O(n log n) of the chunk
+        length instead of O(vocab size * n). Entries made stale by an earlier merge are skipped when popped.
+
+        Args:
+        - tokens: The byte tokens of a single chunk.
+
+        Returns:
+        - The merged token IDs.
+        """
+        tokens = list(tokens)
+        size = len(tokens)
+        if size < 2:
+            return tokens
+        merges = self.merges
+        prev_pos = list(range(-1, size - 1))
+        next_pos = list(range(1, size + 1))
+        next_pos[-1] = -1
+
+        queue = []
+        for i in range(size - 1):
+            merge_id = merges.get((tokens[i], tokens[i + 1]))
+            if merge_id is not None:
+                queue.append((merge_id, i))
+        heapq.heapify(queue)
+
+        while queue:
+            merge_id, pos = heapq.heappop(queue)
+            right_pos = next_pos[pos]
+            if tokens[pos] < 0 or right_pos < 0 or merges.get((tokens[pos], tokens[right_pos])) != merge_id:
+                continue
+
+            # Collapse the right node into the left one and queue the two pairs it now forms
+            after_pos = next_pos[right_pos]
+            tokens[pos] = merge_id
+            tokens[right_pos] = -1
+            next_pos[pos] = after_pos
+            if after_pos >= 0:
+                prev_pos[after_pos] = pos
+                new_merge_id = merges.get((merge_id, tokens[after_pos]))
+                if new_merge_id is not None:
+                    heapq.heappush(queue, (new_merge_id, pos))
+            before_pos = prev_pos[pos]
+            if before_pos >= 0:
+                new_merge_id = merges.get((tokens[before_pos], merge_id))
+                if new_merge_id is not None:
+                    heapq.heappush(queue, (new_merge_id, before_pos))
 
-    def encode_text(self, text: str) -> list[int]:
+        return [token for token in tokens if token >= 0]
+
+    def encode_chunk_reference(self, tokens: list[int]) -> list[int]:
+        """Merges a chunk of tokens by applying every learned merge in order over the whole chunk."""
+        tokens = list(tokens)
+        for merge_id in range(256, 256 + len(self.reverse_merges)):
+            tokens = self.apply_merge_to_tokens(tokens, self.reverse_merges[merge_id], merge_id)
+        return tokens
+
+    def encode_text(self, text: str, as_array: bool = False) -> list[int] | array:
         """
         Encodes the text using the learned merges from BPE.
 
+        Args:
+        - text: The input text to encode.
+        - as_array: If True, returns a compact typed array sized for the vocabulary instead of a list
+          (default is False).
+
+        Returns:
+        - A list or array of token IDs representing the encoded text.
+        """
+        return self.encode_text_chunks(self.split_text(text), as_array)
+
+    def encode_text_chunks(self, chunks: list[str], as_array: bool = False) -> list[int] | array:
+        """
+        Encodes text that has already been split into chunks, e.g. by split_text or StreamingEncoder.
+
+        Args:
+        - chunks: The chunks to encode; merges never cross chunk boundaries.
+        - as_array: If True, returns a compact typed array sized for the vocabulary instead of a list
+          (default is False).
+
+        Returns:
+        - A list or array of the token IDs of all chunks, in order.
+        """
+        typecode = token_typecode(len(self.vocab))
+
+        # Encode every chunk on its own, exactly as the chunks were kept apart during training
+        tokens = array(typecode) if as_array else []
+        cache = self.cache
+        for chunk in chunks:
+            if cache is None:
+                tokens.extend(self.encode_chunk(self.convert_text_to_bytes(chunk)))
+                continue
+            chunk_bytes = chunk.encode("utf-8")
+            chunk_tokens = cache.get(chunk_bytes)
+            if chunk_tokens is None:
+                chunk_tokens = tuple(self.encode_chunk(list(chunk_bytes)))
+                cache.put(chunk_bytes, chunk_tokens)
+            tokens.extend(chunk_tokens)
+        return tokens
+
+    def encode_text_reference(self, text: str) -> list[int]:
+        """
+        Encodes the text with the slower merge-by-merge reference path. The output is identical to encode_text.
+
         Args:
         - text: The input text to encode.
 
         Returns:
         - A list of token IDs representing the encoded text.
         """
-        tokens = self.convert_text_to_bytes(text)
-        for merge_id in range(256, 256 + len(self.reverse_merges)):
-            tokens = self.apply_merge_to_tokens(tokens, self.reverse_merges[merge_id], merge_id)
+        tokens = []
+        for chunk in self.split_text(text):
+            tokens.extend(self.encode_chunk_reference(self.convert_text_to_bytes(chunk)))
         return tokens
 
     def decode_tokens(self, tokens: list[int]) -> str:
@@ -137,8 +1493,270 @@ class BytePairEncoding:
         Returns:
         - The decoded text as a string.
         """
-        text_bytes = b"".join(self.vocab[token] for token in tokens)
-        return text_bytes.decode("utf-8", errors="replace")
+        return self.token_bytes(tokens).decode("utf-8", errors="replace")
+
+    def token_bytes(self, tokens: Iterable[int]) -> bytes:
+        """
+        Returns the concatenated bytes of a sequence of tokens.
+
+        Args:
+        - tokens: Token IDs in the vocabulary.
+
+        Returns:
+        - The bytes the tokens stand for.
+        """
+        if isinstance(self.vocab, MappedVocab):
+            return self.vocab.join(tokens)
+        return b"".join(self.vocab[token] for token in tokens)
+
+
+    def map_batch(self, worker_function: Callable, local_function: Callable, items: list, batch_size: int,
+                  num_workers: int | None = None, chunksize: int | None = None) -> Iterator:
+        """
+        Maps a function over a batch in a process pool, or in-process when the batch is small.
+
+        Every worker receives this tokenizer once, through the pool initializer, and imap streams the
+        results back in input order as soon as they are ready.
+
+        Args:
+        - worker_function: Module-level function applied to each item in a worker process.
+        - local_function: Equivalent function applied to each item when running in-process.
+        - items: The batch to process.
+        - batch_size: Amount of work in the batch, compared against MIN_PARALLEL_BATCH_SIZE.
+        - num_workers: Number of worker processes (default is None, which uses every CPU).
+        - chunksize: Number of items sent to a worker at a time (default is None, which spreads
+          the batch over about four chunks per worker).
+
+        Yields:
+        - The result for each item, in input order.
+        """
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, len(items))
+        if num_workers <= 1 or batch_size < MIN_PARALLEL_BATCH_SIZE:
+            for item in items:
+                yield local_function(item)
+            return
+
+        if chunksize is None:
+            chunksize = max(1, len(items) // (4 * num_workers))
+        with multiprocessing.Pool(num_workers, initializer=_init_batch_worker, initargs=(self,)) as pool:
+            yield from pool.imap(worker_function, items, chunksize)
+
+    def encode_batch(self, texts: Iterable[str], num_workers: int | None = None,
+                     chunksize: int | None = None) -> Iterator[list[int]]:
+        """
+        Encodes many texts across a process pool, yielding the results in input order.
+
+        Args:
+        - texts: The texts to encode.
+        - num_workers: Number of worker processes (default is None, which uses every CPU).
+        - chunksize: Number of texts sent to a worker at a time (default is None, picked from the batch size).
+
+        Yields:
+        - A list of token IDs for each text.
+        """
+        texts = list(texts)
+        batch_size = sum(len(text) for text in texts)
+        yield from self.map_batch(_encode_in_batch_worker, self.encode_text, texts, batch_size, num_workers, chunksize)
+
+    def decode_batch(self, token_lists: Iterable[list[int]], num_workers: int | None = None,
+                     chunksize: int | None = None) -> Iterator[str]:
+        """
+        Decodes many token lists across a process pool, yielding the results in input order.
+
+        Args:
+        - token_lists: The token lists to decode.
+        - num_workers: Number of worker processes (default is None, which uses every CPU).
+        - chunksize: Number of token lists sent to a worker at a time (default is None, picked from the batch size).
+
+        Yields:
+        - The decoded text for each token list.
+        """
+        token_lists = list(token_lists)
+        batch_size = sum(len(tokens) for tokens in token_lists)
+        yield from self.map_batch(_decode_in_batch_worker, self.decode_tokens, token_lists, batch_size, num_workers, chunksize)
+
+    def encode_stream(self, pieces: Iterable[str | bytes]) -> Iterator[list[int]]:
+        """
+        Encodes a stream of text or byte pieces with a StreamingEncoder. With the GPT-2 or GPT-4 split pattern
+        tokens are yielded as the stream goes and the input is never buffered whole; with any other pattern or
+        none, the stream is buffered and encoded at its end. The concatenated output equals encode_text on the
+        whole input.
+
+        Args:
+        - pieces: The pieces of the stream, e.g. lines of a log or blocks read from a socket.
+
+        Yields:
+        - The token IDs that became final after each piece, and the remaining ones at the end of the stream.
+        """
+        encoder = StreamingEncoder(self)
+        for piece in pieces:
+            tokens = encoder.feed(piece)
+            if tokens:
+                yield tokens
+        tokens = encoder.flush()
+        if tokens:
+            yield tokens
+
+    async def encode_stream_async(self, pieces: AsyncIterable[str | bytes]) -> AsyncIterator[list[int]]:
+        """
+        Asynchronous form of encode_stream for asyncio pipelines.
+
+        Args:
+        - pieces: An asynchronous iterable of the pieces of the stream.
+
+        Yields:
+        - The token IDs that became final after each piece, and the remaining ones at the end of the stream.
+        """
+        encoder = StreamingEncoder(self)
+        async for piece in pieces:
+            tokens = encoder.feed(piece)
+            if tokens:
+                yield tokens
+        tokens = encoder.flush()
+        if tokens:
+            yield tokens
+
+    def decode_stream(self, token_lists: Iterable[list[int]]) -> Iterator[str]:
+        """
+        Decodes a stream of token lists with a StreamingDecoder. The concatenated output equals decode_tokens
+        on all the tokens.
+
+        Args:
+        - token_lists: The token IDs of the stream, in pieces, e.g. as yielded by encode_stream.
+
+        Yields:
+        - The text completed by each piece, and the remaining text at the end of the stream.
+        """
+        decoder = StreamingDecoder(self)
+        for tokens in token_lists:
+            text = decoder.feed(tokens)
+            if text:
+                yield text
+        text = decoder.flush()
+        if text:
+            yield text
+
+    async def decode_stream_async(self, token_lists: AsyncIterable[list[int]]) -> AsyncIterator[str]:
+        """
+        Asynchronous form of decode_stream for asyncio pipelines.
+
+        Args:
+        - token_lists: An asynchronous iterable of the token IDs of the stream, in pieces.
+
+        Yields:
+        - The text completed by each piece, and the remaining text at the end of the stream.
+        """
+        decoder = StreamingDecoder(self)
+        async for tokens in token_lists:
+            text = decoder.feed(tokens)
+            if text:
+                yield text
+        text = decoder.flush()
+        if text:
+            yield text
+
+    def save(self, path: str) -> None:
+        """
+        Saves the model in the compact binary model format, see MODEL_HEADER.
+
+        Args:
+        - path: The file to write.
+        """
+        merge_pairs = sorted(self.merges, key=self.merges.get)
+        merges = array("I", [token for pair in merge_pairs for token in pair])
+        vocab_size = len(self.vocab)
+        offsets = array("I", [0])
+        for token_id in range(vocab_size):
+            offsets.append(offsets[-1] + len(self.vocab[token_id]))
+        if sys.byteorder != "little":
+            merges.byteswap()
+            offsets.byteswap()
+
+        flags = 0
+        pattern = b""
+        if self.split_pattern is not None:
+            flags |= MODEL_FLAG_SPLIT_PATTERN
+            pattern = self.split_pattern.encode("utf-8")
+        padding = b"\0" * (-len(pattern) % 4)
+        payload = b"".join([pattern, padding, merges.tobytes(), offsets.tobytes()]
+                           + [self.vocab[token_id] for token_id in range(vocab_size)])
+
+        header = MODEL_HEADER.pack(MODEL_MAGIC, MODEL_VERSION, flags, len(merge_pairs), vocab_size, len(pattern),
+                                   zlib.crc32(payload))
+        with open(path, "wb") as file:
+            file.write(header)
+            file.write(payload)
+
+    def load(self, path: str, verify: bool = True) -> None:
+        """
+        Loads a model saved with save, memory-mapping it instead of reading it into Python objects.
+
+        The vocabulary and reverse_merges are served straight from the mapping; only the merges dict that
+        encoding looks pairs up in is built. The split pattern is restored from the file and the chunk
+        cache is invalidated. A model file opened by an earlier load is closed first.
+
+        Args:
+        - path: The model file to load.
+        - verify: If True, checks the CRC32 of the file (default is True).
+        """
+        model_file = MappedModelFile(path, verify)
+        self.close()
+        self.set_split_pattern(model_file.split_pattern)
+        self.vocab = MappedVocab(model_file)
+        self.reverse_merges = MappedMerges(model_file)
+        pairs = model_file.merges
+        self.merges = dict(zip(zip(pairs[0::2], pairs[1::2]), range(256, 256 + len(self.reverse_merges))))
+        self.invalidate_cache()
+
+    def close(self) -> None:
+        """
+        Unmaps the model file opened by load, so that it can be deleted or replaced; the loaded vocabulary
+        can no longer be used afterwards. Does nothing for a model that was trained rather than loaded.
+        """
+        if isinstance(self.vocab, MappedVocab):
+            self.vocab.model_file.close()
+
+    def export_vocab(self, path: str) -> None:
+        """
+        Writes a human-readable listing of the merges and the vocabulary, one token per line:
+        the token ID, the pair it was merged from (empty for the 256 byte tokens) and the repr of its bytes,
+        so that whitespace and partial UTF-8 sequences stay visible on one line.
+
+        Args:
+        - path: The text file to write.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"# split_pattern: {self.split_pattern!r}\n")
+            for token_id in range(len(self.vocab)):
+                pair = self.reverse_merges.get(token_id)
+                merged_from = f"{pair[0]} {pair[1]}" if pair else ""
+                file.write(f"{token_id}\t{merged_from}\t{self.vocab[token_id]!r}\n")
+
+
+
+def train_from_config(config, verbose=False):
+    """
+    Train a tokenizer on the preprocessed dataset named in the config, streaming it from disk.
+
+    The dataset is read in batches through memory mapping and only the chunk counts are kept, so
+    switching to a larger corpus such as WikiText-103 only needs a change to config.yaml.
+
+    Args:
+        config (dict): The configuration dictionary.
+        verbose (bool): If True, prints information about the merge process.
+
+    Returns:
+        BytePairEncoding: The trained tokenizer.
+    """
+    tokenizer_config = config['tokenizer']
+    bpe = BytePairEncoding(SPLIT_PATTERNS[tokenizer_config['split_pattern']])
+    documents = iter_dataset_texts(config['dataset']['dataset_save_path'], tokenizer_config['split'],
+                                   batch_size=tokenizer_config['batch_size'])
+    bpe.train_bpe(documents, tokenizer_config['vocab_size'], verbose, incremental=tokenizer_config['incremental'],
+                  max_unique_chunks=tokenizer_config['max_unique_chunks'])
+    return bpe
 
 
 # making the training text longer to have more representative token statistics
@@ -146,12 +1764,19 @@ class BytePairEncoding:
 text = """A Programmer’s Introduction to Unicode March 3, 2017 · Coding · 22 Comments  Ｕｎｉｃｏｄｅ! 🅤🅝🅘🅒🅞🅓🅔‽ 🇺\u200c🇳\u200c🇮\u200c🇨\u200c🇴\u200c🇩\u200c🇪! 😄 The very name strikes fear and awe into the hearts of programmers worldwide. We all know we ought to “support Unicode” in our software (whatever that means—like using wchar_t for all the strings, right?). But Unicode can be abstruse, and diving into the thousand-page Unicode Standard plus its dozens of supplementary annexes, reports, and notes can be more than a little intimidating. I don’t blame programmers for still finding the whole thing mysterious, even 30 years after Unicode’s inception.  A few months ago, I got interested in Unicode and decided to spend some time learning more about it in detail. In this article, I’ll give an introduction to it from a programmer’s point of view.  I’m going to focus on the character set and what’s involved in working with strings and files of Unicode text. However, in this article I’m not going to talk about fonts, text layout/shaping/rendering, or localization in detail—those are separate issues, beyond my scope (and knowledge) here.  Diversity and Inherent Complexity The Unicode Codespace Codespace Allocation Scripts Usage Frequency Encodings UTF-8 UTF-16 Combining Marks Canonical Equivalence Normalization Forms Grapheme Clusters And More… Diversity and Inherent Complexity As soon as you start to study Unicode, it becomes clear that it represents a large jump in complexity over character sets like ASCII that you may be more familiar with. It’s not just that Unicode contains a much larger number of characters, although that’s part of it. Unicode also has a great deal of internal structure, features, and special cases, making it much more than what one might expect a mere “character set” to be. We’ll see some of that later in this article.  When confronting all this complexity, especially as an engineer, it’s hard not to find oneself asking, “Why do we need all this? Is this really necessary? Couldn’t it be simplified?”  However, Unicode aims to faithfully represent the entire world’s writing systems. The Unicode Consortium’s stated goal is “enabling people around the world to use computers in any language”. And as you might imagine, the diversity of written languages is immense! To date, Unicode supports 135 different scripts, covering some 1100 languages, and there’s still a long tail of over 100 unsupported scripts, both modern and historical, which people are still working to add.  Given this enormous diversity, it’s inevitable that representing it is a complicated project. Unicode embraces that diversity, and accepts the complexity inherent in its mission to include all human writing systems. It doesn’t make a lot of trade-offs in the name of simplification, and it makes exceptions to its own rules where necessary to further its mission.  Moreover, Unicode is committed not just to supporting texts in any single language, but also to letting multiple languages coexist within one text—which introduces even more complexity.  Most programming languages have libraries available to handle the gory low-level details of text manipulation, but as a programmer, you’ll still need to know about certain Unicode features in order to know when and how to apply them. It may take some time to wrap your head around it all, but don’t be discouraged—think about the billions of people for whom your software will be more accessible through supporting text in their language. Embrace the complexity!  The Unicode Codespace Let’s start with some general orientation. The basic elements of Unicode—its “characters”, although that term isn’t quite right—are called code points. Code points are identified by number, customarily written in hexadecimal with the prefix “U+”, such as U+0041 “A” latin capital letter a or U+03B8 “θ” greek small letter theta. Each code point also has a short name, and quite a few other properties, specified in the Unicode Character Database.  The set of all possible code points is called the codespace. The Unicode codespace consists of 1,114,112 code points. However, only 128,237 of them—about 12% of the codespace—are actually assigned, to date. There’s plenty of room for growth! Unicode also reserves an additional 137,468 code points as “private use” areas, which have no standardized meaning and are available for individual applications to define for their own purposes.  Codespace Allocation To get a feel for how the codespace is laid out, it’s helpful to visualize it. Below is a map of the entire codespace, with one pixel per code point. It’s arranged in tiles for visual coherence; each small square is 16×16 = 256 code points, and each large square is a “plane” of 65,536 code points. There are 17 planes altogether.  Map of the Unicode codespace (click to zoom)  White represents unassigned space. Blue is assigned code points, green is private-use areas, and the small red area is surrogates (more about those later). As you can see, the assigned code points are distributed somewhat sparsely, but concentrated in the first three planes.  Plane 0 is also known as the “Basic Multilingual Plane”, or BMP. The BMP contains essentially all the characters needed for modern text in any script, including Latin, Cyrillic, Greek, Han (Chinese), Japanese, Korean, Arabic, Hebrew, Devanagari (Indian), and many more.  (In the past, the codespace was just the BMP and no more—Unicode was originally conceived as a straightforward 16-bit encoding, with only 65,536 code points. It was expanded to its current size in 1996. However, the vast majority of code points in modern text belong to the BMP.)  Plane 1 contains historical scripts, such as Sumerian cuneiform and Egyptian hieroglyphs, as well as emoji and various other symbols. Plane 2 contains a large block of less-common and historical Han characters. The remaining planes are empty, except for a small number of rarely-used formatting characters in Plane 14; planes 15–16 are reserved entirely for private use.  Scripts Let’s zoom in on the first three planes, since that’s where the action is:  Map of scripts in Unicode planes 0–2 (click to zoom)  This map color-codes the 135 different scripts in Unicode. You can see how Han () and Korean () take up most of the range of the BMP (the left large square). By contrast, all of the European, Middle Eastern, and South Asian scripts fit into the first row of the BMP in this diagram.  Many areas of the codespace are adapted or copied from earlier encodings. For example, the first 128 code points of Unicode are just a copy of ASCII. This has clear benefits for compatibility—it’s easy to losslessly convert texts from smaller encodings into Unicode (and the other direction too, as long as no characters outside the smaller encoding are used).  Usage Frequency One more interesting way to visualize the codespace is to look at the distribution of usage—in other words, how often each code point is actually used in real-world texts. Below is a heat map of planes 0–2 based on a large sample of text from Wikipedia and Twitter (all languages). Frequency increases from black (never seen) through red and yellow to white.  Heat map of code point usage frequency in Unicode planes 0–2 (click to zoom)  You can see that the vast majority of this text sample lies in the BMP, with only scattered usage of code points from planes 1–2. The biggest exception is emoji, which show up here as the several bright squares in the bottom row of plane 1.  Encodings We’ve seen that Unicode code points are abstractly identified by their index in the codespace, ranging from U+0000 to U+10FFFF. But how do code points get represented as bytes, in memory or in a file?  The most convenient, computer-friendliest (and programmer-friendliest) thing to do would be to just store the code point index as a 32-bit integer. This works, but it consumes 4 bytes per code point, which is sort of a lot. Using 32-bit ints for Unicode will cost you a bunch of extra storage, memory, and performance in bandwidth-bound scenarios, if you work with a lot of text.  Consequently, there are several more-compact encodings for Unicode. The 32-bit integer encoding is officially called UTF-32 (UTF = “Unicode Transformation Format”), but it’s rarely used for storage. At most, it comes up sometimes as a temporary internal representation, for examining or operating on the code points in a string.  Much more commonly, you’ll see Unicode text encoded as either UTF-8 or UTF-16. These are both variable-length encodings, made up of 8-bit or 16-bit units, respectively. In these schemes, code points with smaller index values take up fewer bytes, which saves a lot of memory for typical texts. The trade-off is that processing UTF-8/16 texts is more programmatically involved, and likely slower.  UTF-8 In UTF-8, each code point is stored using 1 to 4 bytes, based on its index value.  UTF-8 uses a system of binary prefixes, in which the high bits of each byte mark whether it’s a single byte, the beginning of a multi-byte sequence, or a continuation byte; the remaining bits, concatenated, give the code point index. This table shows how it works:  UTF-8 (binary)\tCode point (binary)\tRange 0xxxxxxx\txxxxxxx\tU+0000–U+007F 110xxxxx 10yyyyyy\txxxxxyyyyyy\tU+0080–U+07FF 1110xxxx 10yyyyyy 10zzzzzz\txxxxyyyyyyzzzzzz\tU+0800–U+FFFF 11110xxx 10yyyyyy 10zzzzzz 10wwwwww\txxxyyyyyyzzzzzzwwwwww\tU+10000–U+10FFFF A handy property of UTF-8 is that code points below 128 (ASCII characters) are encoded as single bytes, and all non-ASCII code points are encoded using sequences of bytes 128–255. This has a couple of nice consequences. First, any strings or files out there that are already in ASCII can also be interpreted as UTF-8 without any conversion. Second, lots of widely-used string programming idioms—such as null termination, or delimiters (newlines, tabs, commas, slashes, etc.)—will just work on UTF-8 strings. ASCII bytes never occur inside the encoding of non-ASCII code points, so searching byte-wise for a null terminator or a delimiter will do the right thing.  Thanks to this convenience, it’s relatively simple to extend legacy ASCII programs and APIs to handle UTF-8 strings. UTF-8 is very widely used in the Unix/Linux and Web worlds, and many programmers argue UTF-8 should be the default encoding everywhere.  However, UTF-8 isn’t a drop-in replacement for ASCII strings in all respects. For instance, code that iterates over the “characters” in a string will need to decode UTF-8 and iterate over code points (or maybe grapheme clusters—more about those later), not bytes. When you measure the “length” of a string, you’ll need to think about whether you want the length in bytes, the length in code points, the width of the text when rendered, or something else.  UTF-16 The other encoding that you’re likely to encounter is UTF-16. It uses 16-bit words, with each code point stored as either 1 or 2 words.  Like UTF-8, we can express the UTF-16 encoding rules in the form of binary prefixes:  UTF-16 (binary)\tCode point (binary)\tRange xxxxxxxxxxxxxxxx\txxxxxxxxxxxxxxxx\tU+0000–U+FFFF 110110xxxxxxxxxx 110111yyyyyyyyyy\txxxxxxxxxxyyyyyyyyyy + 0x10000\tU+10000–U+10FFFF A more common way that people talk about UTF-16 encoding, though, is in terms of code points called “surrogates”. All the code points in the range U+D800–U+DFFF—or in other words, the code points that match the binary prefixes 110110 and 110111 in the table above—are reserved specifically for UTF-16 encoding, and don’t represent any valid characters on their own. They’re only meant to occur in the 2-word encoding pattern above, which is called a “surrogate pair”. Surrogate code points are illegal in any other context! They’re not allowed in UTF-8 or UTF-32 at all.  Historically, UTF-16 is a descendant of the original, pre-1996 versions of Unicode, in which there were only 65,536 code points. The original intention was that there would be no different “encodings”; Unicode was supposed to be a straightforward 16-bit character set. Later, the codespace was expanded to make room for a long tail of less-common (but still important) Han characters, which the Unicode designers didn’t originally plan for. Surrogates were then introduced, as—to put it bluntly—a kludge, allowing 16-bit encodings to access the new code points.  Today, Javascript uses UTF-16 as its standard string representation: if you ask for the length of a string, or iterate over it, etc., the result will be in UTF-16 words, with any code points outside the BMP expressed as surrogate pairs. UTF-16 is also used by the Microsoft Win32 APIs; though Win32 supports either 8-bit or 16-bit strings, the 8-bit version unaccountably still doesn’t support UTF-8—only legacy code-page encodings, like ANSI. This leaves UTF-16 as the only way to get proper Unicode support in Windows. (Update: in Win10 version 1903, they finally added UTF-8 support to the 8-bit APIs! 😊)  By the way, UTF-16’s words can be stored either little-endian or big-endian. Unicode has no opinion on that issue, though it does encourage the convention of putting U+FEFF zero width no-break space at the top of a UTF-16 file as a byte-order mark, to disambiguate the endianness. (If the file doesn’t match the system’s endianness, the BOM will be decoded as U+FFFE, which isn’t a valid code point.)  Combining Marks In the story so far, we’ve been focusing on code points. But in Unicode, a “character” can be more complicated than just an individual code point!  Unicode includes a system for dynamically composing characters, by combining multiple code points together. This is used in various ways to gain flexibility without causing a huge combinatorial explosion in the number of code points.  In European languages, for example, this shows up in the application of diacritics to letters. Unicode supports a wide range of diacritics, including acute and grave accents, umlauts, cedillas, and many more. All these diacritics can be applied to any letter of any alphabet—and in fact, multiple diacritics can be used on a single letter.  If Unicode tried to assign a distinct code point to every possible combination of letter and diacritics, things would rapidly get out of hand. Instead, the dynamic composition system enables you to construct the character you want, by starting with a base code point (the letter) and appending additional code points, called “combining marks”, to specify the diacritics. When a text renderer sees a sequence like this in a string, it automatically stacks the diacritics over or under the base letter to create a composed character.  For example, the accented character “Á” can be expressed as a string of two code points: U+0041 “A” latin capital letter a plus U+0301 “◌́” combining acute accent. This string automatically gets rendered as a single character: “Á”.  Now, Unicode does also include many “precomposed” code points, each representing a letter with some combination of diacritics already applied, such as U+00C1 “Á” latin capital letter a with acute or U+1EC7 “ệ” latin small letter e with circumflex and dot below. I suspect these are mostly inherited from older encodings that were assimilated into Unicode, and kept around for compatibility. In practice, there are precomposed code points for most of the common letter-with-diacritic combinations in European-script languages, so they don’t use dynamic composition that much in typical text.  Still, the system of combining marks does allow for an arbitrary number of diacritics to be stacked on any base character. The reductio-ad-absurdum of this is Zalgo text, which works by ͖͟ͅr͞aṋ̫̠̖͈̗d͖̻̹óm̪͙͕̗̝ļ͇̰͓̳̫ý͓̥̟͍ ̕s̫t̫̱͕̗̰̼̘͜a̼̩͖͇̠͈̣͝c̙͍k̖̱̹͍͘i̢n̨̺̝͇͇̟͙ģ̫̮͎̻̟ͅ ̕n̼̺͈͞u̮͙m̺̭̟̗͞e̞͓̰̤͓̫r̵o̖ṷs҉̪͍̭̬̝̤ ̮͉̝̞̗̟͠d̴̟̜̱͕͚i͇̫̼̯̭̜͡ḁ͙̻̼c̲̲̹r̨̠̹̣̰̦i̱t̤̻̤͍͙̘̕i̵̜̭̤̱͎c̵s ͘o̱̲͈̙͖͇̲͢n͘ ̜͈e̬̲̠̩ac͕̺̠͉h̷̪ ̺̣͖̱ḻ̫̬̝̹ḙ̙̺͙̭͓̲t̞̞͇̲͉͍t̷͔̪͉̲̻̠͙e̦̻͈͉͇r͇̭̭̬͖,̖́ ̜͙͓̣̭s̘̘͈o̱̰̤̲ͅ ̛̬̜̙t̼̦͕̱̹͕̥h̳̲͈͝ͅa̦t̻̲ ̻̟̭̦̖t̛̰̩h̠͕̳̝̫͕e͈̤̘͖̞͘y҉̝͙ ̷͉͔̰̠o̞̰v͈͈̳̘͜er̶f̰͈͔ḻ͕̘̫̺̲o̲̭͙͠ͅw̱̳̺ ͜t̸h͇̭͕̳͍e̖̯̟̠ ͍̞̜͔̩̪͜ļ͎̪̲͚i̝̲̹̙̩̹n̨̦̩̖ḙ̼̲̼͢ͅ ̬͝s̼͚̘̞͝p͙̘̻a̙c҉͉̜̤͈̯̖i̥͡n̦̠̱͟g̸̗̻̦̭̮̟ͅ ̳̪̠͖̳̯̕a̫͜n͝d͡ ̣̦̙ͅc̪̗r̴͙̮̦̹̳e͇͚̞͔̹̫͟a̙̺̙ț͔͎̘̹ͅe̥̩͍ a͖̪̜̮͙̹n̢͉̝ ͇͉͓̦̼́a̳͖̪̤̱p̖͔͔̟͇͎͠p̱͍̺ę̲͎͈̰̲̤̫a̯͜r̨̮̫̣̘a̩̯͖n̹̦̰͎̣̞̞c̨̦̱͔͎͍͖e̬͓͘ ̤̰̩͙̤̬͙o̵̼̻̬̻͇̮̪f̴ ̡̙̭͓͖̪̤“̸͙̠̼c̳̗͜o͏̼͙͔̮r̞̫̺̞̥̬ru̺̻̯͉̭̻̯p̰̥͓̣̫̙̤͢t̳͍̳̖ͅi̶͈̝͙̼̙̹o̡͔n̙̺̹̖̩͝ͅ”̨̗͖͚̩.̯͓  A few other places where dynamic character composition shows up in Unicode:  Vowel-pointing notation in Arabic and Hebrew. In these languages, words are normally spelled with some of their vowels left out. They then have diacritic notation to indicate the vowels (used in dictionaries, language-teaching materials, children’s books, and such). These diacritics are expressed with combining marks.  A Hebrew example, with niqqud:\tאֶת דַלְתִּי הֵזִיז הֵנִיעַ, קֶטֶב לִשְׁכַּתִּי יָשׁוֹד Normal writing (no niqqud):\tאת דלתי הזיז הניע, קטב לשכתי ישוד Devanagari, the script used to write Hindi, Sanskrit, and many other South Asian languages, expresses certain vowels as combining marks attached to consonant letters. For example, “ह” + “\u200bि” = “हि” (“h” + “i” = “hi”). Korean characters stand for syllables, but they are composed of letters called jamo that stand for the vowels and consonants in the syllable. While there are code points for precomposed Korean syllables, it’s also possible to dynamically compose them by concatenating their jamo. For example, “ᄒ” + “ᅡ” + “ᆫ” = “한” (“h” + “a” + “n” = “han”). Canonical Equivalence In Unicode, precomposed characters exist alongside the dynamic composition system. A consequence of this is that there are multiple ways to express “the same” string—different sequences of code points that result in the same user-perceived characters. For example, as we saw earlier, we can express the character “Á” either as the single code point U+00C1, or as the string of two code points U+0041 U+0301.  Another source of ambiguity is the ordering of multiple diacritics in a single character. Diacritic order matters visually when two diacritics apply to the same side of the base character, e.g. both above: “ǡ” (dot, then macron) is different from “ā̇” (macron, then dot). However, when diacritics apply to different sides of the character, e.g. one above and one below, then the order doesn’t affect rendering. Moreover, a character with multiple diacritics might have one of the diacritics precomposed and others expressed as combining marks.  For example, the Vietnamese letter “ệ” can be expressed in five different ways:  Fully precomposed: U+1EC7 “ệ” Partially precomposed: U+1EB9 “ẹ” + U+0302 “◌̂” Partially precomposed: U+00EA “ê” + U+0323 “◌̣” Fully decomposed: U+0065 “e” + U+0323 “◌̣” + U+0302 “◌̂” Fully decomposed: U+0065 “e” + U+0302 “◌̂” + U+0323 “◌̣” Unicode refers to set of strings like this as “canonically equivalent”. Canonically equivalent strings are supposed to be treated as identical for purposes of searching, sorting, rendering, text selection, and so on. This has implications for how you implement operations on text. For example, if an app has a “find in file” operation and the user searches for “ệ”, it should, by default, find occurrences of any of the five versions of “ệ” above!  Normalization Forms To address the problem of “how to handle canonically equivalent strings”, Unicode defines several normalization forms: ways of converting strings into a canonical form so that they can be compared code-point-by-code-point (or byte-by-byte).  The “NFD” normalization form fully decomposes every character down to its component base and combining marks, taking apart any precomposed code points in the string. It also sorts the combining marks in each character according to their rendered position, so e.g. diacritics that go below the character come before the ones that go above the character. (It doesn’t reorder diacritics in the same rendered position, since their order matters visually, as previously mentioned.)  The “NFC” form, conversely, puts things back together into precomposed code points as much as possible. If an unusual combination of diacritics is called for, there may not be any precomposed code point for it, in which case NFC still precomposes what it can and leaves any remaining combining marks in place (again ordered by rendered position, as in NFD).  There are also forms called NFKD and NFKC. The “K” here refers to compatibility decompositions, which cover characters that are “similar” in some sense but not visually identical. However, I’m not going to cover that here.  Grapheme Clusters As we’ve seen, Unicode contains various cases where a thing that a user thinks of as a single “character” might actually be made up of multiple code points under the hood. Unicode formalizes this using the notion of a grapheme cluster: a string of one or more code points that constitute a single “user-perceived character”.  UAX #29 defines the rules for what, precisely, qualifies as a grapheme cluster. It’s approximately “a base code point followed by any number of combining marks”, but the actual definition is a bit more complicated; it accounts for things like Korean jamo, and emoji ZWJ sequences.  The main thing grapheme clusters are used for is text editing: they’re often the most sensible unit for cursor placement and text selection boundaries. Using grapheme clusters for these purposes ensures that you can’t accidentally chop off some diacritics when you copy-and-paste text, that left/right arrow keys always move the cursor by one visible character, and so on.  Another place where grapheme clusters are useful is in enforcing a string length limit—say, on a database field. While the true, underlying limit might be something like the byte length of the string in UTF-8, you wouldn’t want to enforce that by just truncating bytes. At a minimum, you’d want to “round down” to the nearest code point boundary; but even better, round down to the nearest grapheme cluster boundary. Otherwise, you might be corrupting the last character by cutting off a diacritic, or interrupting a jamo sequence or ZWJ sequence.  And More… There’s much more that could be said about Unicode from a programmer’s perspective! I haven’t gotten into such fun topics as case mapping, collation, compatibility decompositions and confusables, Unicode-aware regexes, or bidirectional text. Nor have I said anything yet about implementation issues—how to efficiently store and look-up data about the sparsely-assigned code points, or how to optimize UTF-8 decoding, string comparison, or NFC normalization. Perhaps I’ll return to some of those things in future posts.  Unicode is a fascinating and complex system. It has a many-to-one mapping between bytes and code points, and on top of that a many-to-one (or, under some circumstances, many-to-many) mapping between code points and “characters”. It has oddball special cases in every corner. But no one ever claimed that representing all written languages was going to be easy, and it’s clear that we’re never going back to the bad old days of a patchwork of incompatible encodings.  Further reading:  The Unicode Standard UTF-8 Everywhere Manifesto Dark corners of Unicode by Eevee ICU (International Components for Unicode)—C/C++/Java libraries implementing many Unicode algorithms and related things Python 3 Unicode Howto Google Noto Fonts—set of fonts intended to cover all assigned code points"""
 
 # Example usage:
-bpe = BytePairEncoding()
-bpe.train_bpe(text, 276, True)
+if __name__ == "__main__":
+    bpe = BytePairEncoding()
+    bpe.train_bpe(text, 276, True)
+
+    print("Vocabulary:", bpe.vocab)
+    print("Merges:", bpe.merges)
+    print("Reverse Merges:", bpe.reverse_merges)
 
-print("Vocabulary:", bpe.vocab)
-print("Merges:", bpe.merges)
-print("Reverse Merges:", bpe.reverse_merges)
+    print(len(bpe.convert_text_to_bytes(text)))
+    print(len(bpe.encode_text(text)))
 
-print(len(bpe.convert_text_to_bytes(text)))
-print(len(bpe.encode_text(text)))
\ No newline at end of file
+    # Train on the preprocessed dataset as well, once 01_preprocess_dataset.py has saved it
+    config = load_config()
+    if os.path.exists(config['dataset']['dataset_save_path']):
+        dataset_bpe = train_from_config(config)
+        print(f"Trained {len(dataset_bpe.merges)} merges on {config['dataset']['dataset_save_path']}")
@@ -0,0 +1,659 @@
+import argparse
+import importlib
+import json
+import math
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# The tokenizer module name starts with a digit, so it has to be imported through importlib
+bpe_module = importlib.import_module("02_bpe_tokenizer")
+BytePairEncoding = bpe_module.BytePairEncoding
+
+# Vocabulary size used to compare the pair-counting backends
+BACKEND_VOCAB_SIZE = 512
+
+# Vocabulary sizes to benchmark training at
+VOCAB_SIZES = [276, 512, 1024, 2048]
+
+# Vocabulary size of the tokenizer used for the encoding benchmarks
+ENCODE_VOCAB_SIZE = 1024
+
+# Characters used to build random inputs for the encoder equivalence check
+RANDOM_ALPHABET = "aab ab\n.,'é€😄\u200cא"
+
+# Training modes of the benchmark suite, mapped to the incremental argument of train_bpe
+SUITE_TRAINING_MODES = {"full": False, "incremental": True}
+
+# Lengths in characters of the inputs the suite measures encoding and decoding latency on
+SUITE_INPUT_LENGTHS = {"short": 64, "long": 16384}
+
+# Number of inputs of each length the latencies are measured on
+SUITE_INPUT_COUNT = 200
+
+# Every measurement is repeated this many times and the fastest run is kept, to filter out noise
+SUITE_REPEATS = 3
+
+# Metrics compared against a baseline, mapped to whether a higher value is better
+BASELINE_METRICS = {
+    "total_s": False,
+    "per_merge_ms": False,
+    "peak_memory_mb": False,
+    "mb_per_s": True,
+    "tokens_per_s": True,
+    "p50_ms": False,
+    "p99_ms": False,
+}
+
+# Relative change of a metric, in the worse direction, that is reported as a regression
+BASELINE_TOLERANCE = 0.10
+
+
+def load_training_split(config, split="train"):
+    """
+    Load a split of the dataset saved by 01_preprocess_dataset.py as one text, one document per line.
+
+    Args:
+        config (dict): The configuration dictionary.
+        split (str): The split to load.
+
+    Returns:
+        str | None: The text of the split, or None if the preprocessed dataset has not been saved yet.
+    """
+    dataset_save_path = config['dataset']['dataset_save_path']
+    if not os.path.exists(dataset_save_path):
+        return None
+    return "\n".join(bpe_module.iter_dataset_texts(dataset_save_path, split))
+
+
+def benchmark_training(text, target_vocab_size, incremental):
+    """
+    Train a tokenizer once and measure how long the merges took.
+
+    Args:
+        text (str): The training text.
+        target_vocab_size (int): The desired size of the vocabulary.
+        incremental (bool): Whether to use the incremental pair-count trainer.
+
+    Returns:
+        tuple: The trained tokenizer and the total training time in seconds.
+    """
+    bpe = BytePairEncoding()
+    start = time.perf_counter()
+    bpe.train_bpe(text, target_vocab_size, incremental=incremental)
+    elapsed = time.perf_counter() - start
+    return bpe, elapsed
+
+
+def compare_training(text, vocab_sizes):
+    """
+    Compare the full-recount trainer with the incremental trainer across vocabulary sizes,
+    checking that both learn exactly the same merges.
+
+    Args:
+        text (str): The training text.
+        vocab_sizes (List[int]): The vocabulary sizes to train at.
+    """
+    print(f"Training text: {len(text.encode('utf-8'))} bytes")
+    print(f"{'vocab':>8} {'mode':>12} {'total [s]':>12} {'per merge [ms]':>16}")
+    for vocab_size in vocab_sizes:
+        num_merges = vocab_size - 256
+        results = {}
+        for mode, incremental in (("full", False), ("incremental", True)):
+            bpe, elapsed = benchmark_training(text, vocab_size, incremental)
+            results[mode] = bpe
+            print(f"{vocab_size:>8} {mode:>12} {elapsed:>12.3f} {1000 * elapsed / num_merges:>16.3f}")
+
+        if list(results["full"].merges.items()) != list(results["incremental"].merges.items()):
+            raise AssertionError(f"Incremental training learned different merges at vocab size {vocab_size}")
+
+
+def compare_backends(text, vocab_size):
+    """
+    Compare training with the pure-Python and NumPy backends, checking that both learn exactly the same merges.
+
+    Args:
+        text (str): The text to train on.
+        vocab_size (int): The desired size of the vocabulary.
+    """
+    print(f"Comparing backends on {len(text.encode('utf-8'))} bytes, vocab size {vocab_size}")
+    print(f"{'backend':>8} {'train [s]':>12}")
+    results = {}
+    for backend in bpe_module.BACKENDS:
+        bpe = BytePairEncoding(backend=backend)
+        start = time.perf_counter()
+        bpe.train_bpe(text, vocab_size)
+        elapsed = time.perf_counter() - start
+        results[backend] = list(bpe.merges.items())
+        print(f"{backend:>8} {elapsed:>12.3f}")
+
+    if results["python"] != results["numpy"]:
+        raise AssertionError("The NumPy backend learned different merges")
+
+
+def peak_memory(function, *args, **kwargs):
+    """
+    Call a function under tracemalloc and return the peak memory it allocated, in bytes.
+    """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def train_bpe_with_lists(text, target_vocab_size):
+    """
+    Train the way BytePairEncoding.train_bpe did before training used compact arrays: the tokens are a
+    Python int list, pairs are recounted over it for every merge and each merge builds a new list.
+
+    Args:
+        text (str): The training text.
+        target_vocab_size (int): The desired size of the vocabulary.
+
+    Returns:
+        dict: The learned merges.
+    """
+    tokens = list(text.encode("utf-8"))
+    merges = {}
+    while 256 + len(merges) < target_vocab_size:
+        pair_stats = {}
+        for pair in zip(tokens, tokens[1:]):
+            pair_stats[pair] = pair_stats.get(pair, 0) + 1
+        merge_pair = max(pair_stats, key=pair_stats.get)
+        new_token_id = merges[merge_pair] = 256 + len(merges)
+        new_tokens = []
+        i = 0
+        while i < len(tokens):
+            if i < len(tokens) - 1 and (tokens[i], tokens[i + 1]) == merge_pair:
+                new_tokens.append(new_token_id)
+                i += 2
+            else:
+                new_tokens.append(tokens[i])
+                i += 1
+        tokens = new_tokens
+    return merges
+
+
+def compare_training_memory(text, vocab_size, target_reduction=10):
+    """
+    Compare the peak memory of training with the list-based trainer that training used before, and
+    report how far each trainer is from the targeted reduction. The incremental trainer keeps pair
+    positions and links for every token, so it needs several times more than the full trainer.
+
+    Args:
+        text (str): The training text.
+        vocab_size (int): The desired size of the vocabulary.
+        target_reduction (int): The targeted ratio of the list-based peak to the compact peak.
+    """
+    num_bytes = len(text.encode("utf-8"))
+    print(f"Peak training memory on {num_bytes} bytes, vocab size {vocab_size}")
+    list_peak = peak_memory(train_bpe_with_lists, text, vocab_size)
+    print(f"{'lists':>12} {list_peak / num_bytes:>12.2f} bytes per input byte")
+    for mode, incremental in (("full", False), ("incremental", True)):
+        peak = peak_memory(BytePairEncoding().train_bpe, text, vocab_size, incremental=incremental)
+        reduction = list_peak / peak
+        verdict = "meets" if reduction >= target_reduction else f"misses by {target_reduction / reduction:.2f}x"
+        print(f"{mode:>12} {peak / num_bytes:>12.2f} bytes per input byte, {reduction:.2f}x less than lists "
+              f"({verdict} the {target_reduction}x target)")
+
+
+def compare_streaming_memory(documents, repeat_counts):
+    """
+    Measure the peak memory of streaming ever larger corpora into chunk counts, which should stay
+    roughly flat because only the distinct chunks are kept.
+
+    Args:
+        documents (List[str]): The documents that are streamed, once per repeat.
+        repeat_counts (List[int]): How many times the documents are streamed in each measurement.
+    """
+    bpe = BytePairEncoding(bpe_module.GPT4_SPLIT_PATTERN)
+    num_bytes = sum(len(document.encode("utf-8")) for document in documents)
+    print("Peak memory of streaming documents into chunk counts")
+    for repeats in repeat_counts:
+        stream = (document for _ in range(repeats) for document in documents)
+        peak = peak_memory(bpe.get_chunk_frequencies, stream)
+        print(f"{repeats * num_bytes:>12} bytes {peak / 1e6:>12.2f} MB")
+
+
+def compare_sharded_training(text, vocab_size, shard_counts):
+    """
+    Compare single-process incremental training with sharded training on text split with the GPT-4 pattern,
+    checking that every shard count learns exactly the same merges.
+
+    Args:
+        text (str): The training text.
+        vocab_size (int): The desired size of the vocabulary.
+        shard_counts (List[int]): Numbers of shards to train with.
+    """
+    pattern = bpe_module.GPT4_SPLIT_PATTERN
+    start = time.perf_counter()
+    expected = BytePairEncoding(pattern)
+    expected.train_bpe(text, vocab_size, incremental=True)
+    print(f"{'single':>12} {time.perf_counter() - start:>12.3f} s")
+    for num_shards in shard_counts:
+        start = time.perf_counter()
+        bpe = BytePairEncoding(pattern)
+        bpe.train_bpe_sharded(text, vocab_size, num_shards=num_shards)
+        print(f"{str(num_shards) + ' shards':>12} {time.perf_counter() - start:>12.3f} s")
+        if list(bpe.merges.items()) != list(expected.merges.items()):
+            raise AssertionError(f"Sharded training with {num_shards} shards learned different merges")
+
+
+def random_texts(sample_text, count, seed=0):
+    """
+    Generate random inputs for the encoder equivalence check: strings drawn from a small alphabet that
+    produce long runs of repeated and overlapping pairs, and random slices of the Unicode sample text.
+
+    Args:
+        sample_text (str): Text to cut random slices from.
+        count (int): Number of inputs of each kind.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        List[str]: The generated inputs.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        length = rng.randint(0, 200)
+        texts.append("".join(rng.choice(RANDOM_ALPHABET) for _ in range(length)))
+        start = rng.randrange(len(sample_text))
+        texts.append(sample_text[start:start + rng.randint(0, 2000)])
+    return texts
+
+
+def compare_encoding(bpe, text, num_random_texts=200):
+    """
+    Check that the rank-based encoder matches the merge-by-merge reference encoder and compare their speed.
+
+    Args:
+        bpe (BytePairEncoding): A trained tokenizer.
+        text (str): The text to time the encoders on.
+        num_random_texts (int): Number of random inputs of each kind to check.
+    """
+    for sample in random_texts(text, num_random_texts) + [text]:
+        if bpe.encode_text(sample) != bpe.encode_text_reference(sample):
+            raise AssertionError(f"Rank-based encoding differs from the reference on {sample!r}")
+
+    print(f"Encoding {len(text.encode('utf-8'))} bytes with {len(bpe.vocab)} tokens in the vocabulary")
+    for mode, encode in (("reference", bpe.encode_text_reference), ("rank-based", bpe.encode_text)):
+        start = time.perf_counter()
+        encode(text)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>12} {elapsed:>12.3f} s")
+
+
+def compare_cache(text, vocab_size, cache_max_entries=10000):
+    """
+    Compare encoding with and without the LRU chunk cache on text split with the GPT-4 pattern.
+
+    Args:
+        text (str): The text to train on and encode.
+        vocab_size (int): The desired size of the vocabulary.
+        cache_max_entries (int): Capacity of the chunk cache.
+    """
+    pattern = bpe_module.GPT4_SPLIT_PATTERN
+    uncached = BytePairEncoding(pattern)
+    uncached.train_bpe(text, vocab_size, incremental=True)
+    cached = BytePairEncoding(pattern, cache_max_entries=cache_max_entries)
+    cached.train_bpe(text, vocab_size, incremental=True)
+
+    print(f"Encoding {len(text.encode('utf-8'))} bytes split with the GPT-4 pattern")
+    for mode, bpe in (("uncached", uncached), ("cached", cached)):
+        start = time.perf_counter()
+        tokens = bpe.encode_text(text)
+        elapsed = time.perf_counter() - start
+        print(f"{mode:>12} {elapsed:>12.3f} s")
+    if tokens != uncached.encode_text(text):
+        raise AssertionError("Cached encoding differs from uncached encoding")
+    print(f"Cache statistics: {cached.cache.stats()}")
+
+
+def compare_batch_workers(bpe, texts, worker_counts):
+    """
+    Measure encode_batch throughput with different numbers of worker processes.
+
+    Args:
+        bpe (BytePairEncoding): A trained tokenizer.
+        texts (List[str]): The documents to encode.
+        worker_counts (List[int]): Numbers of worker processes to try.
+    """
+    num_bytes = sum(len(text.encode("utf-8")) for text in texts)
+    print(f"Batch encoding {len(texts)} documents, {num_bytes} bytes")
+    expected = None
+    for num_workers in worker_counts:
+        start = time.perf_counter()
+        results = list(bpe.encode_batch(texts, num_workers=num_workers))
+        elapsed = time.perf_counter() - start
+        print(f"{num_workers:>8} workers {num_bytes / elapsed / 1e6:>10.2f} MB/s")
+        if expected is None:
+            expected = results
+        elif results != expected:
+            raise AssertionError(f"Batch encoding with {num_workers} workers returned different tokens")
+
+
+def compare_model_loading(bpe, text):
+    """
+    Save a trained tokenizer in the binary model format, time loading it back, and check that the
+    loaded model encodes and decodes exactly like the original.
+
+    Args:
+        bpe (BytePairEncoding): A trained tokenizer.
+        text (str): The text to check the loaded model on.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "model.bin")
+        bpe.save(path)
+        start = time.perf_counter()
+        loaded = BytePairEncoding()
+        loaded.load(path)
+        elapsed = time.perf_counter() - start
+        try:
+            print(f"Loaded {os.path.getsize(path)} byte model with {len(loaded.merges)} merges in {1000 * elapsed:.2f} ms")
+
+            tokens = bpe.encode_text(text)
+            if loaded.encode_text(text) != tokens or loaded.decode_tokens(tokens) != bpe.decode_tokens(tokens):
+                raise AssertionError("The loaded model does not encode and decode like the saved one")
+
+            # The loaded model copies vocabulary entries out of the mapping on first use, so time a second decode too
+            for mode, model in (("in memory", bpe), ("loaded", loaded), ("loaded again", loaded)):
+                start = time.perf_counter()
+                model.decode_tokens(tokens)
+                print(f"{'decode ' + mode:>20} {1000 * (time.perf_counter() - start):>10.2f} ms")
+        finally:
+            # The file cannot be removed with the directory on Windows while it is still mapped
+            loaded.close()
+
+
+def compare_streaming(text, vocab_size, piece_sizes):
+    """
+    Check that streaming encoding and decoding in pieces of different sizes give exactly the same output
+    as encode_text and decode_tokens on the whole text, and compare their speed.
+
+    Args:
+        text (str): The text to train on and stream.
+        vocab_size (int): The desired size of the vocabulary.
+        piece_sizes (List[int]): Sizes in bytes of the pieces the UTF-8 text is streamed in.
+    """
+    bpe = BytePairEncoding(bpe_module.GPT4_SPLIT_PATTERN)
+    bpe.train_bpe(text, vocab_size, incremental=True)
+    data = text.encode("utf-8")
+    start = time.perf_counter()
+    expected = bpe.encode_text(text)
+    print(f"Streaming {len(data)} bytes split with the GPT-4 pattern")
+    print(f"{'whole':>12} {time.perf_counter() - start:>12.3f} s")
+    for piece_size in piece_sizes:
+        pieces = [data[i:i + piece_size] for i in range(0, len(data), piece_size)]
+        start = time.perf_counter()
+        tokens = [token for tokens in bpe.encode_stream(pieces) for token in tokens]
+        print(f"{str(piece_size) + ' B pieces':>12} {time.perf_counter() - start:>12.3f} s")
+        if tokens != expected:
+            raise AssertionError(f"Streaming encoding in {piece_size} byte pieces differs from encode_text")
+        token_pieces = [tokens[i:i + piece_size] for i in range(0, len(tokens), piece_size)]
+        if "".join(bpe.decode_stream(token_pieces)) != bpe.decode_tokens(tokens):
+            raise AssertionError(f"Streaming decoding in {piece_size} token pieces differs from decode_tokens")
+
+
+def percentile(values, fraction):
+    """
+    Return the nearest-rank percentile of a list of values.
+
+    Args:
+        values (List[float]): The measured values.
+        fraction (float): The percentile as a fraction, e.g. 0.99.
+
+    Returns:
+        float: The smallest value that at least that fraction of the values is less than or equal to.
+    """
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(len(ordered) * fraction) - 1)]
+
+
+def benchmark_training_suite(text, vocab_size, incremental, split_pattern):
+    """
+    Train a tokenizer SUITE_REPEATS times and keep the total time and time per merge of the fastest run,
+    then train it once with profiling for the time per phase and the counters, and once under tracemalloc
+    to measure the peak memory. Profiling adds a timer call per phase, so it is kept out of the totals.
+
+    Args:
+        text (str): The training text.
+        vocab_size (int): The desired size of the vocabulary.
+        incremental (bool): Whether to use the incremental pair-count trainer.
+        split_pattern (str | None): The regex used to split the text into chunks.
+
+    Returns:
+        dict: The metrics of the run.
+    """
+    elapsed = None
+    for _ in range(SUITE_REPEATS):
+        bpe = BytePairEncoding(split_pattern)
+        start = time.perf_counter()
+        bpe.train_bpe(text, vocab_size, incremental=incremental)
+        run_elapsed = time.perf_counter() - start
+        if elapsed is None or run_elapsed < elapsed:
+            elapsed = run_elapsed
+    bpe = BytePairEncoding(split_pattern, profile=True)
+    bpe.train_bpe(text, vocab_size, incremental=incremental)
+    profile = bpe.profiler.stats()
+    peak = peak_memory(BytePairEncoding(split_pattern).train_bpe, text, vocab_size, incremental=incremental)
+    return {
+        "total_s": elapsed,
+        "per_merge_ms": 1000 * elapsed / (vocab_size - 256),
+        "peak_memory_mb": peak / 1e6,
+        "phases_s": profile["timings"],
+        "counters": profile["counters"],
+    }
+
+
+def benchmark_latency(function, inputs, input_bytes, output_tokens):
+    """
+    Call a function on every input and measure its throughput and latency percentiles, keeping the
+    fastest of SUITE_REPEATS calls for each input.
+
+    Args:
+        function (Callable): The function to time, encode_text or decode_tokens.
+        inputs (List): The inputs to call it on.
+        input_bytes (int): The total UTF-8 length of the texts behind the inputs.
+        output_tokens (int): The total number of tokens behind the inputs.
+
+    Returns:
+        dict: The metrics of the run.
+    """
+    latencies = []
+    for item in inputs:
+        fastest = None
+        for _ in range(SUITE_REPEATS):
+            start = time.perf_counter()
+            function(item)
+            elapsed = time.perf_counter() - start
+            if fastest is None or elapsed < fastest:
+                fastest = elapsed
+        latencies.append(fastest)
+    total = sum(latencies)
+    return {
+        "mb_per_s": input_bytes / total / 1e6,
+        "tokens_per_s": output_tokens / total,
+        "p50_ms": 1000 * percentile(latencies, 0.5),
+        "p99_ms": 1000 * percentile(latencies, 0.99),
+    }
+
+
+def benchmark_encoding_suite(bpe, text, length, seed=0):
+    """
+    Measure encode_text and decode_tokens on random slices of a text.
+
+    Args:
+        bpe (BytePairEncoding): A trained tokenizer.
+        text (str): The text to cut the inputs from.
+        length (int): The length of each input in characters.
+        seed (int): Seed of the random generator that places the slices.
+
+    Returns:
+        dict: The encoding and decoding metrics.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(SUITE_INPUT_COUNT):
+        start = rng.randrange(max(1, len(text) - length))
+        texts.append(text[start:start + length])
+    token_lists = [bpe.encode_text(sample) for sample in texts]
+    input_bytes = sum(len(sample.encode("utf-8")) for sample in texts)
+    output_tokens = sum(len(tokens) for tokens in token_lists)
+    return {
+        "encode": benchmark_latency(bpe.encode_text, texts, input_bytes, output_tokens),
+        "decode": benchmark_latency(bpe.decode_tokens, token_lists, input_bytes, output_tokens),
+    }
+
+
+def run_suite(corpora, vocab_sizes, split_pattern_name):
+    """
+    Run the benchmark suite on every corpus, printing each result as it is measured.
+
+    Args:
+        corpora (Dict[str, str]): The texts to benchmark on, by name.
+        vocab_sizes (List[int]): The vocabulary sizes to train at.
+        split_pattern_name (str): Name of the split pattern in SPLIT_PATTERNS.
+
+    Returns:
+        dict: The metadata of the run and the metrics keyed by "corpus/operation/variant".
+    """
+    split_pattern = bpe_module.SPLIT_PATTERNS[split_pattern_name]
+    results = {}
+    for corpus, text in corpora.items():
+        print(f"Corpus {corpus}: {len(text.encode('utf-8'))} bytes")
+        for vocab_size in vocab_sizes:
+            for mode, incremental in SUITE_TRAINING_MODES.items():
+                metrics = benchmark_training_suite(text, vocab_size, incremental, split_pattern)
+                results[f"{corpus}/train/{mode}/{vocab_size}"] = metrics
+                phases = " ".join(f"{phase}={seconds:.3f}s" for phase, seconds in sorted(metrics["phases_s"].items()))
+                print(f"  train {mode:>11} {vocab_size:>6}: {metrics['total_s']:>8.3f} s "
+                      f"{metrics['per_merge_ms']:>8.3f} ms/merge {metrics['peak_memory_mb']:>8.2f} MB  {phases}")
+
+        bpe = BytePairEncoding(split_pattern)
+        bpe.train_bpe(text, ENCODE_VOCAB_SIZE, incremental=True)
+        for size_name, length in SUITE_INPUT_LENGTHS.items():
+            for operation, metrics in benchmark_encoding_suite(bpe, text, length).items():
+                results[f"{corpus}/{operation}/{size_name}"] = metrics
+                print(f"  {operation} {size_name:>6}: {metrics['mb_per_s']:>8.2f} MB/s {metrics['tokens_per_s']:>12.0f} tokens/s "
+                      f"p50 {metrics['p50_ms']:.3f} ms p99 {metrics['p99_ms']:.3f} ms")
+
+    metadata = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "split_pattern": split_pattern_name,
+        "encode_vocab_size": ENCODE_VOCAB_SIZE,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return {"metadata": metadata, "results": results}
+
+
+def compare_with_baseline(suite, baseline, tolerance=BASELINE_TOLERANCE):
+    """
+    Compare the metrics of a suite run with a saved baseline run, printing the relative change of
+    every metric both runs measured.
+
+    Args:
+        suite (dict): The output of run_suite.
+        baseline (dict): A previous output of run_suite, loaded from JSON.
+        tolerance (float): Relative change in the worse direction above which a metric regressed.
+
+    Returns:
+        List[str]: Descriptions of the metrics that regressed.
+    """
+    regressions = []
+    print(f"Comparison with the baseline from {baseline['metadata'].get('created', 'unknown')}")
+    for key, metrics in suite["results"].items():
+        baseline_metrics = baseline["results"].get(key)
+        if baseline_metrics is None:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            if metric not in metrics or not baseline_metrics.get(metric):
+                continue
+            change = metrics[metric] / baseline_metrics[metric] - 1
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            marker = "REGRESSION" if regressed else ""
+            print(f"  {key:<40} {metric:>14} {baseline_metrics[metric]:>12.4f} -> {metrics[metric]:>12.4f} {change:>+8.1%} {marker}")
+            if regressed:
+                regressions.append(f"{key} {metric} {change:+.1%}")
+    return regressions
+
+
+def run_checks():
+    """
+    Run the equivalence checks and implementation comparisons: full vs incremental vs sharded training,
+    memory, backends, encoders, model loading, caching, streaming and batch workers.
+    """
+    # Overlapping slices of the sample text, repeated until the batch is large enough to run in parallel
+    documents = [bpe_module.text[i:i + 3000] for i in range(0, len(bpe_module.text), 300)] * 20
+
+    compare_training(bpe_module.text, VOCAB_SIZES)
+    compare_sharded_training(bpe_module.text, ENCODE_VOCAB_SIZE, sorted({1, 2, os.cpu_count() or 1}))
+    compare_training_memory(bpe_module.text * 40, 266)
+    compare_streaming_memory(documents, [1, 2, 4])
+
+    # The backends are compared on the WikiText-2 training split when it has been preprocessed
+    wikitext = load_training_split(bpe_module.load_config())
+    if wikitext is None:
+        print("Preprocessed dataset not found, comparing backends on the sample text instead")
+        wikitext = bpe_module.text
+    compare_backends(wikitext, BACKEND_VOCAB_SIZE)
+
+    bpe = BytePairEncoding()
+    bpe.train_bpe(bpe_module.text, ENCODE_VOCAB_SIZE, incremental=True)
+    compare_encoding(bpe, bpe_module.text)
+    compare_model_loading(bpe, bpe_module.text)
+
+    compare_cache(bpe_module.text, ENCODE_VOCAB_SIZE)
+    compare_streaming(bpe_module.text, ENCODE_VOCAB_SIZE, [1, 7, 64, 4096])
+
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+    compare_batch_workers(bpe, documents, worker_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BPE training, encoding and decoding.")
+    parser.add_argument("--output", help="write the suite results to this JSON file")
+    parser.add_argument("--baseline", help="compare the suite results with this JSON file and exit with 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=BASELINE_TOLERANCE,
+                        help="relative slowdown reported as a regression (default: %(default)s)")
+    parser.add_argument("--vocab-sizes", type=int, nargs="+", default=VOCAB_SIZES, help="vocabulary sizes to train at")
+    parser.add_argument("--skip-checks", action="store_true",
+                        help="skip the equivalence checks and implementation comparisons that run after the suite")
+    args = parser.parse_args()
+
+    config = bpe_module.load_config()
+    corpora = {"sample": bpe_module.text}
+    wikitext = load_training_split(config)
+    if wikitext is None:
+        print("Preprocessed dataset not found, benchmarking on the sample text only")
+    else:
+        corpora["wikitext"] = wikitext
+
+    suite = run_suite(corpora, args.vocab_sizes, config['tokenizer']['split_pattern'])
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(suite, file, indent=2)
+        print(f"Results written to {args.output}")
+
+    if not args.skip_checks:
+        run_checks()
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_with_baseline(suite, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} metrics regressed by more than {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()